@@ -0,0 +1,124 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import write_catalogue  # noqa: E402
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+NUTRITION_TARGET = {"protein": 70, "fat": 50, "carb": 100}
+
+
+def median_time(fn, repeat):
+	samples = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		fn()
+		samples.append(time.perf_counter() - start)
+	return statistics.median(samples)
+
+
+def bench_size(workdir, dishes, history_days, repeat):
+	from diet_engine.history import open_history_backend
+	from diet_engine.selector import DishSelector
+
+	excel = write_catalogue(os.path.join(workdir, f"synthetic_{dishes}.xlsx"), dishes)
+	data_dir = os.path.join(workdir, f"data_{dishes}")
+	results = {}
+
+	start = time.perf_counter()
+	selector = DishSelector(excel, data_dir=data_dir)
+	results["load_cold"] = time.perf_counter() - start
+	selector.close()
+	results["load_cached"] = median_time(lambda: DishSelector(excel, data_dir=data_dir).close(), repeat)
+	selector = DishSelector(excel, data_dir=data_dir)
+
+	results["generate"] = median_time(lambda: selector.generate_daily_menu(NUTRITION_TARGET), repeat)
+	results["regenerate"] = median_time(lambda: selector.generate_daily_menu(NUTRITION_TARGET, regenerate=True),
+	                                    repeat)
+
+	# 先批量写入指定天数的历史，再测单天确认和读历史
+	start_date = datetime.date(2000, 1, 1)
+	selector.generate_plan(start_date, history_days, NUTRITION_TARGET)
+	days = iter(range(history_days, history_days + repeat))
+	menu = selector.generate_daily_menu(NUTRITION_TARGET)
+	results["add_menu_to_history"] = median_time(
+		lambda: selector.add_menu_to_history(start_date + datetime.timedelta(days=next(days)), menu), repeat)
+	results["update_inventory"] = median_time(lambda: selector.update_ingredient_inventory(menu), repeat)
+	selector.close()
+
+	def load_history():
+		history = open_history_backend("sqlite", selector.get_history_db_path(excel))
+		history.range("0001-01-01", "9999-12-31")
+		history.close()
+	results["load_history"] = median_time(load_history, repeat)
+	return results
+
+
+def compare(results, baselines, tolerance):
+	regressions = []
+	for size, metrics in results.items():
+		for metric, seconds in metrics.items():
+			baseline = baselines.get(size, {}).get(metric)
+			if baseline and seconds > baseline * (1 + tolerance):
+				regressions.append(f"{size} {metric}: {baseline * 1000:.2f} ms -> {seconds * 1000:.2f} ms")
+	return regressions
+
+
+def main():
+	parser = argparse.ArgumentParser(description="DishSelector 热点路径基准测试（合成食谱）")
+	parser.add_argument("--sizes", default="100,1000,10000", help="逗号分隔的菜品数量，最多可到 1000000")
+	parser.add_argument("--history-days", type=int, default=365)
+	parser.add_argument("--repeat", type=int, default=20)
+	parser.add_argument("--output", help="把结果写成 JSON 文件")
+	parser.add_argument("--compare", action="store_true", help="和 baselines.json 比较，变慢超过容差时返回非零")
+	parser.add_argument("--tolerance", type=float, default=0.5, help="允许的变慢比例")
+	parser.add_argument("--update-baseline", action="store_true", help="把本次结果写入 baselines.json")
+	args = parser.parse_args()
+
+	workdir = tempfile.mkdtemp(prefix="diet-bench-")
+	try:
+		results = {}
+		for size in [int(value) for value in args.sizes.split(",")]:
+			results[str(size)] = bench_size(workdir, size, args.history_days, args.repeat)
+			print(f"{size:>8} dishes: " + ", ".join(f"{k} {v * 1000:.2f} ms" for k, v in results[str(size)].items()),
+			      file=sys.stderr)
+	finally:
+		shutil.rmtree(workdir, ignore_errors=True)
+
+	report = {
+		"meta": {"python": platform.python_version(), "machine": platform.machine(),
+		         "history_days": args.history_days, "repeat": args.repeat},
+		"results": results,
+	}
+	text = json.dumps(report, indent=2)
+	if args.output:
+		with open(args.output, 'w', encoding='utf-8') as f:
+			f.write(text)
+	else:
+		print(text)
+
+	if args.update_baseline:
+		with open(BASELINE_FILE, 'w', encoding='utf-8') as f:
+			f.write(text + "\n")
+	if args.compare and os.path.exists(BASELINE_FILE):
+		with open(BASELINE_FILE, 'r', encoding='utf-8') as f:
+			regressions = compare(results, json.load(f)["results"], args.tolerance)
+		for line in regressions:
+			print(f"变慢: {line}", file=sys.stderr)
+		return 1 if regressions else 0
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,48 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 拆分前想用 DishSelector 只能 import diet，会连带加载下面这些 GUI 和 pandas 依赖
+CASES = {
+	"legacy (tkinter + tkcalendar + pandas)": "import tkinter, tkcalendar, pandas",
+	"diet (GUI)": "import diet",
+	"diet_engine": "import diet_engine",
+	"diet_engine.cli": "import diet_engine.cli",
+	"diet_engine.selector": "from diet_engine.selector import DishSelector",
+}
+
+
+def time_import(statement, repeat):
+	samples = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		subprocess.run([sys.executable, "-c", statement], cwd=ROOT, check=True)
+		samples.append(time.perf_counter() - start)
+	return statistics.median(samples)
+
+
+def main():
+	parser = argparse.ArgumentParser(description="冷启动 import 耗时（每次新开解释器）")
+	parser.add_argument("--repeat", type=int, default=7)
+	parser.add_argument("--json", action="store_true", help="输出 JSON")
+	args = parser.parse_args()
+
+	baseline = time_import("pass", args.repeat)
+	results = {name: time_import(statement, args.repeat) - baseline for name, statement in CASES.items()}
+
+	if args.json:
+		print(json.dumps({"interpreter": baseline, "imports": results}, indent=2))
+		return
+	print(f"{'interpreter startup':<40}{baseline * 1000:8.1f} ms")
+	for name, seconds in results.items():
+		print(f"{name:<40}{seconds * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,73 @@
+import argparse
+import json
+import os
+import sys
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import COLUMNS, generate_rows  # noqa: E402
+
+
+def traced_size(build):
+	tracemalloc.start()
+	result = build()
+	size, _ = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	return size, result
+
+
+def catalogue_columns(count):
+	import numpy as np
+	from diet_engine.importer import row_fingerprint
+
+	rows = list(generate_rows(count))
+	columns = {col: np.array([row[col] for row in rows]) for col in COLUMNS}
+	# 和食谱缓存里一样带上每行的指纹，热加载靠它跳过没改过的行
+	columns['fingerprint'] = np.array([row_fingerprint(row, COLUMNS) for row in rows], dtype=np.uint64)
+	return columns
+
+
+def bench_size(dishes, history_days):
+	from diet_engine.catalogue import CatalogueCache
+
+	cache = CatalogueCache(os.devnull, os.devnull)
+	columns = catalogue_columns(dishes)
+
+	def as_dicts():
+		values = [columns[col].tolist() for col in COLUMNS]
+		return [dict(zip(COLUMNS, row)) for row in zip(*values)]
+
+	dict_bytes, _ = traced_size(as_dicts)
+	record_bytes, records = traced_size(lambda: cache.to_records(columns))
+
+	# 历史记录：旧版每天存两道菜的全部字段，现在只存编号和菜名
+	legacy = {f"day{i}": [records[(2 * i) % dishes].to_dict(), records[(2 * i + 1) % dishes].to_dict()]
+	          for i in range(history_days)}
+	compact = {f"day{i}": {"version": "0" * 40, "ids": [(2 * i) % dishes, (2 * i + 1) % dishes],
+	                       "names": [records[(2 * i) % dishes].name, records[(2 * i + 1) % dishes].name]}
+	           for i in range(history_days)}
+	return {
+		"catalogue_dict_mb": dict_bytes / 1e6,
+		"catalogue_records_mb": record_bytes / 1e6,
+		"history_legacy_kb": len(json.dumps(legacy, ensure_ascii=False).encode('utf-8')) / 1e3,
+		"history_compact_kb": len(json.dumps(compact, ensure_ascii=False).encode('utf-8')) / 1e3,
+	}
+
+
+def main():
+	parser = argparse.ArgumentParser(description="菜品记录和历史记录的内存 / 体积对比")
+	parser.add_argument("--sizes", default="1000,10000,100000", help="逗号分隔的菜品数量")
+	parser.add_argument("--history-days", type=int, default=3650, help="历史记录天数")
+	args = parser.parse_args()
+
+	for size in [int(value) for value in args.sizes.split(",")]:
+		result = bench_size(size, args.history_days)
+		print(f"{size} 道菜: dict {result['catalogue_dict_mb']:.1f} MB -> 记录 {result['catalogue_records_mb']:.1f} MB；"
+		      f"{args.history_days} 天历史 {result['history_legacy_kb']:.0f} KB -> {result['history_compact_kb']:.0f} KB")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,56 @@
+import argparse
+import datetime
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import write_catalogue  # noqa: E402
+
+
+def bench_confirms(excel, data_dir, backend, confirms, synchronous):
+	from diet_engine.persist import shared_writer
+	from diet_engine.selector import DishSelector
+
+	shutil.rmtree(data_dir, ignore_errors=True)
+	selector = DishSelector(excel, data_dir=data_dir, history_backend=backend)
+	menu = selector.dishes[:2]
+	writer = shared_writer()
+	writes = writer.writes
+	start_date = datetime.date(2020, 1, 1)
+	start = time.perf_counter()
+	for day in range(confirms):
+		selector.add_menu_to_history(start_date + datetime.timedelta(days=day), menu)
+		if synchronous:
+			# 相当于原来每次确认都把整个文件重写一遍（这里还多了 fsync）
+			writer.flush()
+	selector.close()
+	elapsed = time.perf_counter() - start
+	return confirms / elapsed, writer.writes - writes
+
+
+def main():
+	parser = argparse.ArgumentParser(description="连续确认菜单的吞吐：每次都写文件 vs 后台合并写")
+	parser.add_argument("--dishes", type=int, default=1000)
+	parser.add_argument("--confirms", type=int, default=2000, help="确认的天数（每次一天）")
+	args = parser.parse_args()
+
+	workdir = tempfile.mkdtemp(prefix="bench_persist_")
+	try:
+		excel = os.path.join(workdir, "catalogue.xlsx")
+		write_catalogue(excel, args.dishes)
+		for label, backend, synchronous in (("json 每次都写", "json", True), ("json 合并写", "json", False),
+		                                    ("sqlite", "sqlite", False)):
+			rate, writes = bench_confirms(excel, os.path.join(workdir, "data"), backend, args.confirms, synchronous)
+			print(f"{label:12s}: {rate:8.0f} 次确认/秒，实际写文件 {writes} 次")
+	finally:
+		shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+	main()
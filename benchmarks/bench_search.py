@@ -0,0 +1,68 @@
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import write_catalogue  # noqa: E402
+
+NUTRITION_TARGET = {"protein": 70, "fat": 50, "carb": 100}
+
+
+def nutrition_error(menu):
+	return sum((sum(dish[n] for dish in menu) - target) ** 2 / target ** 2 for n, target in NUTRITION_TARGET.items())
+
+
+def bench(excel, data_dir, mode, candidates, workers, repeat):
+	from diet_engine.selector import DishSelector
+
+	selector = DishSelector(excel, data_dir=data_dir, nutrition_mode=mode, search_candidates=candidates,
+	                        search_workers=workers)
+	try:
+		# 先跑一次，让进程池和缓存都准备好
+		selector.generate_daily_menu(NUTRITION_TARGET)
+		samples, errors = [], []
+		for _ in range(repeat):
+			start = time.perf_counter()
+			menu = selector.generate_daily_menu(NUTRITION_TARGET)
+			samples.append(time.perf_counter() - start)
+			errors.append(nutrition_error(menu))
+	finally:
+		selector.close()
+	return statistics.median(samples), statistics.mean(errors)
+
+
+def main():
+	parser = argparse.ArgumentParser(description="search 模式随候选数和进程数的延迟与营养偏差")
+	parser.add_argument("--dishes", type=int, default=10000)
+	parser.add_argument("--candidates", default="64,256,1024,4096,16384,65536", help="逗号分隔的候选数 K")
+	parser.add_argument("--workers", default="1,2,4", help="逗号分隔的进程数")
+	parser.add_argument("--repeat", type=int, default=20)
+	args = parser.parse_args()
+
+	random.seed(0)
+	workdir = tempfile.mkdtemp(prefix="diet_bench_")
+	try:
+		excel = write_catalogue(os.path.join(workdir, f"synthetic_{args.dishes}.xlsx"), args.dishes)
+		data_dir = os.path.join(workdir, "data")
+		print(f"{args.dishes} 道菜，CPU {os.cpu_count()} 核")
+		for mode in ("heuristic", "match"):
+			seconds, error = bench(excel, data_dir, mode, 0, 1, args.repeat)
+			print(f"{mode:>9}: {seconds * 1000:8.2f} ms  营养偏差 {error:.4f}")
+		for workers in [int(value) for value in args.workers.split(",")]:
+			for candidates in [int(value) for value in args.candidates.split(",")]:
+				seconds, error = bench(excel, data_dir, "search", candidates, workers, args.repeat)
+				print(f"search K={candidates:<6} workers={workers}: {seconds * 1000:8.2f} ms  营养偏差 {error:.4f}")
+	finally:
+		shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+	main()
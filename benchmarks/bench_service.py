@@ -0,0 +1,108 @@
+import argparse
+import http.client
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+import concurrent.futures
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+DEFAULT_EXCEL = os.path.join(ROOT, "可用食谱.xlsx")
+
+
+def client_loop(port, excel, household, deadline):
+	# 每个客户端：生成一天菜单再确认，直到时间用完；返回 (完成请求数, 出错请求数)
+	connection = http.client.HTTPConnection("127.0.0.1", port)
+	completed = errors = 0
+	day = 0
+	while time.perf_counter() < deadline:
+		body = json.dumps({"excel": excel, "household": household, "date": f"2030-01-{day % 28 + 1:02d}"})
+		connection.request("POST", "/generate", body, {"Content-Type": "application/json"})
+		response = connection.getresponse()
+		reply = json.loads(response.read())
+		day += 1
+		if response.status != 200:
+			errors += 1
+			continue
+		names = {date: [dish["name"] for dish in menu] for date, menu in reply["menus"].items()}
+		body = json.dumps({"excel": excel, "household": household, "menus": names})
+		connection.request("POST", "/confirm", body, {"Content-Type": "application/json"})
+		response = connection.getresponse()
+		response.read()
+		completed += 2
+		errors += response.status != 200
+	connection.close()
+	return completed, errors
+
+
+def run(workers, clients, households, seconds, excel_path, cache_size):
+	from diet_engine.service import create_server
+
+	data_root = tempfile.mkdtemp(prefix="diet-bench-")
+	server = create_server("127.0.0.1", 0, os.path.dirname(excel_path), data_root, workers=workers,
+	                       cache_size=cache_size)
+	thread = threading.Thread(target=server.serve_forever, daemon=True)
+	thread.start()
+	port = server.server_address[1]
+	excel = os.path.basename(excel_path)
+	try:
+		# 预热：把每个用户的食谱实例加载进缓存
+		for i in range(households):
+			connection = http.client.HTTPConnection("127.0.0.1", port)
+			connection.request("GET", "/history?" + urllib.parse.urlencode({"excel": excel, "household": f"h{i}"}))
+			connection.getresponse().read()
+			connection.close()
+
+		# 客户端放在独立进程里，避免和服务端抢同一个 GIL
+		with concurrent.futures.ProcessPoolExecutor(max_workers=clients) as pool:
+			list(pool.map(time.sleep, [0] * clients))
+			deadline = time.perf_counter() + seconds
+			start = time.perf_counter()
+			futures = [pool.submit(client_loop, port, excel, f"h{i % households}", deadline) for i in range(clients)]
+			results = [future.result() for future in futures]
+			elapsed = time.perf_counter() - start
+	finally:
+		server.shutdown()
+		server.server_close()
+		server.service.shutdown()
+		shutil.rmtree(data_root, ignore_errors=True)
+	return sum(completed for completed, _ in results) / elapsed, sum(errors for _, errors in results)
+
+
+def main():
+	parser = argparse.ArgumentParser(description="菜单服务吞吐量压测（generate + confirm）")
+	parser.add_argument("--excel", default=DEFAULT_EXCEL)
+	parser.add_argument("--workers", default="1,2,4,8", help="逗号分隔的工作线程数")
+	parser.add_argument("--clients", type=int, default=16)
+	parser.add_argument("--households", type=int, default=8)
+	parser.add_argument("--seconds", type=float, default=5)
+	parser.add_argument("--cache-sizes", default="all,2",
+	                    help="逗号分隔的缓存容量，all 表示能装下所有用户；比用户数小时会不断换出正在用的实例")
+	parser.add_argument("--json", action="store_true", help="输出 JSON")
+	args = parser.parse_args()
+
+	results = {}
+	failures = 0
+	for value in args.cache_sizes.split(","):
+		cache_size = args.households if value == "all" else int(value)
+		for workers in [int(value) for value in args.workers.split(",")]:
+			throughput, errors = run(workers, args.clients, args.households, args.seconds,
+			                         os.path.abspath(args.excel), cache_size)
+			results[f"cache={cache_size},workers={workers}"] = throughput
+			failures += errors
+			if not args.json:
+				print(f"cache={cache_size:<3} workers={workers:<3} {throughput:8.1f} req/s  出错 {errors} 次")
+	if args.json:
+		print(json.dumps({"requests_per_second": results, "errors": failures}, indent=2))
+	if failures:
+		sys.exit(1)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,127 @@
+import argparse
+import datetime
+import json
+import os
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import write_catalogue  # noqa: E402
+
+START = datetime.date(2020, 1, 1)
+
+
+def child(excel, data_dir, inject, after):
+	# 不停地确认菜单；inject 指定在第 after 次写文件时在哪一步直接退出进程
+	from diet_engine import persist
+	from diet_engine.selector import DishSelector
+
+	writes = [0]
+	if inject == "before_replace":
+		replace = persist.os.replace
+
+		def crash_replace(src, dst):
+			writes[0] += 1
+			if writes[0] >= after:
+				os._exit(3)
+			replace(src, dst)
+		persist.os.replace = crash_replace
+	elif inject == "mid_write":
+		fsync = persist.os.fsync
+
+		def crash_fsync(fd):
+			writes[0] += 1
+			if writes[0] >= after:
+				# 临时文件只写了一半就断电
+				os.ftruncate(fd, os.fstat(fd).st_size // 2)
+				os._exit(3)
+			fsync(fd)
+		persist.os.fsync = crash_fsync
+	# 写得勤一些，崩溃才会落在写文件的各个阶段
+	writer = persist.shared_writer()
+	writer.delay, writer.max_delay = 0.005, 0.05
+
+	selector = DishSelector(excel, data_dir=data_dir, history_backend="json")
+	menu = selector.dishes[:2]
+	for day in range(100000):
+		selector.add_menu_to_history(START + datetime.timedelta(days=day), menu)
+		print(day, flush=True)
+		time.sleep(0.001)
+
+
+def check(data_dir):
+	# 文件都能正常解析，历史记录是从第一天开始连续的若干天
+	problems = []
+	days = 0
+	for name in os.listdir(data_dir):
+		path = os.path.join(data_dir, name)
+		# JSON 历史记录沿用旧的 _history.txt 文件名
+		if name.endswith((".json", "_history.txt")):
+			try:
+				with open(path, 'r', encoding='utf-8') as f:
+					content = json.load(f)
+			except ValueError as e:
+				problems.append(f"{name} 损坏: {e}")
+				continue
+			if name.endswith("_history.txt"):
+				days = len(content)
+				expected = {(START + datetime.timedelta(days=day)).isoformat() for day in range(days)}
+				if set(content) != expected:
+					problems.append(f"{name} 不是连续的前 {days} 天")
+		elif ".corrupt-" in name:
+			problems.append(f"出现了损坏文件 {name}")
+	return problems, days
+
+
+def main():
+	parser = argparse.ArgumentParser(description="写文件时随机杀进程，检查历史记录和材料库不会损坏")
+	parser.add_argument("--rounds", type=int, default=30)
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--child", nargs=4, help=argparse.SUPPRESS)
+	args = parser.parse_args()
+	if args.child:
+		excel, data_dir, inject, after = args.child
+		child(excel, data_dir, inject, int(after))
+		return
+
+	rng = random.Random(args.seed)
+	workdir = tempfile.mkdtemp(prefix="crash_persist_")
+	failures = 0
+	try:
+		excel = os.path.join(workdir, "catalogue.xlsx")
+		write_catalogue(excel, 100)
+		for round_id in range(args.rounds):
+			data_dir = os.path.join(workdir, f"data{round_id}")
+			inject = ("kill", "before_replace", "mid_write")[round_id % 3]
+			process = subprocess.Popen([sys.executable, __file__, "--child", excel, data_dir, inject,
+			                            str(rng.randint(1, 20))], stdout=subprocess.PIPE, text=True)
+			if inject == "kill":
+				time.sleep(rng.uniform(0.5, 2.0))
+				process.send_signal(signal.SIGKILL if hasattr(signal, "SIGKILL") else signal.SIGTERM)
+			output = process.communicate(timeout=120)[0].split()
+			confirmed = int(output[-1]) + 1 if output else 0
+			problems, saved = check(data_dir) if os.path.isdir(data_dir) else ([], 0)
+			status = "损坏" if problems else "完好"
+			print(f"第 {round_id + 1:2d} 轮 {inject:14s}: 已确认 {confirmed:5d} 天，落盘 {saved:5d} 天"
+			      f"（丢失最近 {max(confirmed - saved, 0)} 天），{status}")
+			for problem in problems:
+				print(f"    {problem}")
+			# 被杀时可能刚写完某一天还没来得及打印
+			failures += bool(problems) or saved > confirmed + 1
+	finally:
+		shutil.rmtree(workdir, ignore_errors=True)
+	if failures:
+		print(f"{failures} 轮出现损坏")
+		sys.exit(1)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,132 @@
+import argparse
+import math
+import os
+import random
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import generate_rows  # noqa: E402
+
+DIFFICULTY = {"易": 1, "中": 0.9, "难": 0.8}
+
+
+def linear_choice(rng, weights, allowed, count):
+	# 换成抽样树之前的 weighted_random_choice：候选的累计权重里按均匀随机数二分，一次抽 count 个
+	candidates = np.flatnonzero(allowed)
+	cumulative_weight = np.cumsum(weights[candidates])
+	total_weight = cumulative_weight[-1]
+	rand_val = rng.uniform(0, total_weight, count)
+	position = np.minimum(np.searchsorted(cumulative_weight, rand_val), len(candidates) - 1)
+	return candidates[position]
+
+
+def chi2_sf(statistic, df):
+	# 卡方分布的右尾概率，用 Wilson-Hilferty 近似；自由度几十以上时足够准
+	z = ((statistic / df) ** (1 / 3) - (1 - 2 / (9 * df))) / math.sqrt(2 / (9 * df))
+	return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def pooled_bins(expected, *counts):
+	# 期望次数不到 5 的格子合并成一格，卡方近似才可靠
+	small = expected < 5
+	if not small.any():
+		return (expected,) + counts
+	return tuple(np.append(values[~small], values[small].sum()) for values in (expected,) + counts)
+
+
+def homogeneity(tree_counts, linear_counts, probabilities, draws):
+	# 两组抽样频率是否来自同一分布（两样本卡方），以及各自和理论概率是否一致
+	expected, tree_counts, linear_counts = pooled_bins(probabilities * draws, tree_counts, linear_counts)
+	together = tree_counts + linear_counts
+	used = together > 0
+	two_sample = ((tree_counts - linear_counts)[used] ** 2 / together[used]).sum()
+	df = len(expected) - 1
+	tree_fit = ((tree_counts - expected) ** 2 / expected).sum()
+	linear_fit = ((linear_counts - expected) ** 2 / expected).sum()
+	return chi2_sf(two_sample, df), chi2_sf(tree_fit, df), chi2_sf(linear_fit, df)
+
+
+def run_case(store, exclusion, draws, rng):
+	allowed = np.ones(len(store), dtype=bool) if exclusion is None else ~exclusion.mask()
+	weights = store.weights if store.discount is None else store.weights * store.discount
+	tree = np.array([store.draw(exclusion) for _ in range(draws)])
+	linear = linear_choice(rng, weights, allowed, draws)
+	# 折扣到 0 的菜和被排除的一样，一次都不该抽到
+	allowed &= weights > 0
+	probabilities = np.where(allowed, weights, 0.0) / weights[allowed].sum()
+	leaked = int((~allowed[tree]).sum())
+	tree_counts = np.bincount(tree, minlength=len(store))[allowed].astype(float)
+	linear_counts = np.bincount(linear, minlength=len(store))[allowed].astype(float)
+	return homogeneity(tree_counts, linear_counts, probabilities[allowed], draws) + (leaked,)
+
+
+def main():
+	parser = argparse.ArgumentParser(description="抽样树和原来的线性扫描抽样在统计上是否一致（含排除和单点更新）")
+	parser.add_argument("--dishes", type=int, default=300)
+	parser.add_argument("--draws", type=int, default=200000, help="每种情况每个抽样器抽多少次")
+	parser.add_argument("--alpha", type=float, default=1e-4, help="p 值低于它就算不一致")
+	parser.add_argument("--seed", type=int, default=0)
+	args = parser.parse_args()
+
+	from diet_engine.weights import WeightStore
+
+	random.seed(args.seed)
+	rng = np.random.default_rng(args.seed)
+	rows = list(generate_rows(args.dishes, args.seed))
+	store = WeightStore(rows, [row['preference'] * DIFFICULTY[row['difficulty']] for row in rows])
+	store.refresh_sampler()
+	lunch = rows[0]
+
+	def point_updates():
+		# 和选菜时一样：最近吃过的降权、整体奖励、选中的加权、重新生成时降权，都只改抽样树上的几个点
+		for i in range(10):
+			store.mark_recent(store.names[i])
+		store.apply_penalty_and_reward(0.3, 1.01)
+		for i in range(10, 40):
+			store.scale(store.names[i], 1.05 if i % 2 else 0.7)
+		if store.sampler_dirty:
+			raise SystemExit("单点更新触发了整棵重建，没有测到单点更新")
+
+	def discount_updates():
+		# 只有几道菜的折扣变了，也是逐个更新抽样树
+		factors = np.ones(len(store))
+		factors[40:45] = [0.5, 0.1, 0.0, 0.8, 0.3]
+		store.set_discount(factors)
+		if store.sampler_dirty:
+			raise SystemExit("折扣变化触发了整棵重建，没有测到单点更新")
+
+	cases = [
+		("全部菜", lambda: None),
+		("排除同名和主蛋白", lambda: store.exclusion([lunch['name']], [("main_protein", lunch['main_protein'])])),
+		("排除主蛋白和难度", lambda: store.exclusion([], [("main_protein", "牛肉"), ("difficulty", "难")])),
+		("单点更新后", lambda: point_updates()),
+		("单点更新后再排除", lambda: store.exclusion([lunch['name']], [("main_protein", lunch['main_protein'])])),
+		("折扣单点更新后", lambda: discount_updates()),
+	]
+	failures = 0
+	for title, prepare in cases:
+		exclusion = prepare()
+		p_two, p_tree, p_linear, leaked = run_case(store, exclusion, args.draws, rng)
+		ok = all(p >= args.alpha for p in (p_two, p_tree, p_linear)) and not leaked
+		failures += not ok
+		print(f"{title:10s}: 两样本 p={p_two:.3f}，抽样树 p={p_tree:.3f}，线性扫描 p={p_linear:.3f}，"
+		      f"抽到被排除的菜 {leaked} 次，{'一致' if ok else '不一致'}")
+
+	store.set_discount(None)
+	# 对照：模拟漏掉一次单点更新（权重翻倍了，抽样树没跟着改），检验应该能发现
+	store.log_weights[int(store.log_weights.argmax())] += math.log(2)
+	p_two, _, _, _ = run_case(store, None, args.draws, rng)
+	detected = p_two < args.alpha
+	failures += not detected
+	print(f"对照（漏掉一次单点更新）: 两样本 p={p_two:.2e}，{'能发现' if detected else '没发现，检验力不够'}")
+	if failures:
+		sys.exit(1)
+
+
+if __name__ == "__main__":
+	main()
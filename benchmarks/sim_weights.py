@@ -0,0 +1,168 @@
+import argparse
+import decimal
+import math
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import generate_rows  # noqa: E402
+
+PENALTY, REWARD, CHOSEN, REJECTED = 0.3, 1.01, 1.05, 0.7
+DIFFICULTY = {"易": 1, "中": 0.9, "难": 0.8}
+
+
+class ReferenceWeights:
+	# 按原来的做法直接乘真实权重，用 50 位十进制算，作为“正确”的抽样概率
+	def __init__(self, store, initial_weights):
+		decimal.getcontext().prec = 50
+		self.store = store
+		self.weights = [decimal.Decimal(w) for w in initial_weights]
+		self.nutrients = {nutrient: [decimal.Decimal(float(v)) for v in values] for nutrient, values in store.nutrients.items()}
+
+	def penalty_and_reward(self, recent_ids):
+		for i in recent_ids:
+			self.weights[i] *= decimal.Decimal(PENALTY)
+		reward = decimal.Decimal(REWARD)
+		self.weights = [w * reward for w in self.weights]
+
+	def nutrition_gap(self, gap):
+		for nutrient, value in gap.items():
+			if value > 0:
+				factor = decimal.Decimal(self.store.nutrient_factors[nutrient])
+				self.weights = [w + n * factor for w, n in zip(self.weights, self.nutrients[nutrient])]
+
+	def scale(self, i, factor):
+		self.weights[i] *= decimal.Decimal(factor)
+
+	def probabilities(self):
+		total = sum(self.weights)
+		return [float(w / total) for w in self.weights]
+
+
+def compare(store, reference):
+	weights = store.sampling_weights
+	total = weights.sum()
+	expected = reference.probabilities()
+	actual = (weights / total).tolist()
+	distance = 0.5 * sum(abs(a - e) for a, e in zip(actual, expected))
+	relative = max(abs(a - e) / e for a, e in zip(actual, expected) if e > 1e-12)
+	return distance, relative
+
+
+def simulate(args):
+	from diet_engine.weights import WeightStore
+
+	rng = random.Random(args.seed)
+	random.seed(args.seed)
+	rows = list(generate_rows(args.dishes, args.seed))
+	initial = [row['preference'] * DIFFICULTY[row['difficulty']] for row in rows]
+	store = WeightStore(rows, initial)
+	reference = ReferenceWeights(store, initial)
+	recent, previous = [], []
+	worst = 0.0
+
+	def remember(i):
+		recent.append(i)
+		store.mark_recent(store.names[i])
+		if len(recent) > 3:
+			store.mark_recent(store.names[recent.pop(0)], -1)
+
+	days = int(args.years * 365)
+	for day in range(1, days + 1):
+		for _ in range(args.generates_per_day):
+			# 和 DishSelector.generate_menu_candidates 一样的顺序：奖惩、重新生成时降权、抽午餐、营养加成、抽晚餐、选中加权
+			regenerate = previous and rng.random() < args.regenerate
+			store.apply_penalty_and_reward(PENALTY, REWARD)
+			reference.penalty_and_reward(list(store.recent_counts))
+			if regenerate:
+				for i in previous:
+					store.scale(store.names[i], REJECTED)
+					reference.scale(i, REJECTED)
+			lunch = store.draw()
+			remember(lunch)
+			gap = {nutrient: rng.uniform(-20, 40) for nutrient in store.nutrient_factors}
+			store.apply_nutrition_gap(gap)
+			reference.nutrition_gap(gap)
+			dinner = store.draw()
+			remember(dinner)
+			previous = [lunch, dinner]
+			for i in previous:
+				store.scale(store.names[i], CHOSEN)
+				reference.scale(i, CHOSEN)
+		if day % 365 == 0 or day == days:
+			distance, relative = compare(store, reference)
+			worst = max(worst, distance)
+			print(f"第 {day / 365:5.1f} 年: 概率总变差 {distance:.2e}，最大相对误差 {relative:.2e}，"
+			      f"offset {store.offset:8.2f}，相对对数权重范围 [{store.log_weights.min():.1f}, {store.log_weights.max():.1f}]，"
+			      f"真实权重最大约 10^{(store.log_weights.max() + store.offset) / math.log(10):.0f}")
+	return store, worst
+
+
+def check_draws(store, draws):
+	# 抽样树抽出来的频率和概率一致
+	import numpy as np
+
+	store.refresh_sampler()
+	counts = np.bincount([store.draw() for _ in range(draws)], minlength=len(store))
+	weights = store.sampling_weights
+	return 0.5 * np.abs(counts / draws - weights / weights.sum()).sum()
+
+
+def bench_reward(size, repeat):
+	import numpy as np
+
+	from diet_engine.weights import WeightStore
+
+	rows = list(generate_rows(size))
+	store = WeightStore(rows, [1.0] * size)
+	store.refresh_sampler()
+	for i in range(3):
+		store.mark_recent(store.names[i])
+	start = time.perf_counter()
+	for _ in range(repeat):
+		store.apply_penalty_and_reward(PENALTY, REWARD)
+	log_space = (time.perf_counter() - start) / repeat
+	# 原来的做法：最近的菜乘惩罚，再整体乘奖励，然后重建抽样树
+	weights = np.ones(size)
+	recent = np.zeros(size, dtype=bool)
+	recent[:3] = True
+	start = time.perf_counter()
+	for _ in range(repeat):
+		weights[recent] *= PENALTY
+		weights *= REWARD
+		store.sampler.rebuild(weights[store.order])
+	full_pass = (time.perf_counter() - start) / repeat
+	return log_space, full_pass
+
+
+def main():
+	parser = argparse.ArgumentParser(description="长期使用下权重的数值稳定性：和高精度参考实现比较抽样概率")
+	parser.add_argument("--years", type=float, default=12)
+	parser.add_argument("--dishes", type=int, default=200)
+	parser.add_argument("--generates-per-day", type=int, default=2)
+	parser.add_argument("--regenerate", type=float, default=0.3, help="每次生成时“重新生成”的概率")
+	parser.add_argument("--draws", type=int, default=200000, help="最后检查抽样频率用的抽取次数")
+	parser.add_argument("--tolerance", type=float, default=1e-9, help="允许的概率总变差")
+	parser.add_argument("--reward-size", type=int, default=1000000, help="测统一奖励耗时用的菜品数量")
+	parser.add_argument("--seed", type=int, default=0)
+	args = parser.parse_args()
+
+	store, worst = simulate(args)
+	draw_distance = check_draws(store, args.draws)
+	print(f"{args.draws} 次抽取的频率和概率的总变差 {draw_distance:.4f}")
+	log_space, full_pass = bench_reward(args.reward_size, 20)
+	print(f"{args.reward_size} 道菜每次奖惩：对数 + offset {log_space * 1000:.3f} ms，逐个相乘并重建抽样树 {full_pass * 1000:.1f} ms")
+
+	# 抽样误差约为 sqrt(菜品数 / 抽取次数)
+	if not worst <= args.tolerance or draw_distance > 2 * math.sqrt(args.dishes / args.draws):
+		print("抽样概率偏离参考实现")
+		sys.exit(1)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,55 @@
+import argparse
+import random
+
+COLUMNS = ['name', 'calories', 'protein', 'fat', 'carb', 'preference', 'difficulty',
+           'main_ingredients', 'side_ingredients', 'main_protein']
+PROTEINS = ["蛋类", "牛肉", "猪肉", "鸡肉", "鱼肉", "虾/豆制品", "混合", "无"]
+SIDES = ["葱", "姜", "蒜", "小米辣", "香菜", "花椒", "八角"]
+UNITS = ["g", "个", "根", "块"]
+
+
+def generate_rows(count, seed=0, vocabulary=500):
+	rng = random.Random(seed)
+	ingredients = [f"食材{i}" for i in range(vocabulary)]
+	for i in range(count):
+		protein, fat, carb = rng.randint(0, 45), rng.randint(0, 30), rng.randint(0, 60)
+		main = [f"{name} {rng.choice([50, 100, 150, 200, 250])}{rng.choice(UNITS)}"
+		        for name in rng.sample(ingredients, rng.randint(1, 4))]
+		yield {
+			'name': f"合成菜{i}",
+			'calories': protein * 4 + fat * 9 + carb * 4,
+			'protein': protein,
+			'fat': fat,
+			'carb': carb,
+			'preference': rng.randint(1, 5),
+			'difficulty': rng.choice(["易", "中", "难"]),
+			'main_ingredients': "，".join(main),
+			'side_ingredients': "，".join(rng.sample(SIDES, rng.randint(0, 3))) or "-",
+			'main_protein': rng.choice(PROTEINS),
+		}
+
+
+def write_catalogue(path, count, seed=0):
+	from openpyxl import Workbook
+
+	# write_only 模式逐行写入，一百万行也不会把整张表放进内存
+	workbook = Workbook(write_only=True)
+	sheet = workbook.create_sheet()
+	sheet.append(COLUMNS)
+	for row in generate_rows(count, seed):
+		sheet.append([row[col] for col in COLUMNS])
+	workbook.save(path)
+	return path
+
+
+def main():
+	parser = argparse.ArgumentParser(description="生成符合模板的合成食谱 Excel")
+	parser.add_argument("output")
+	parser.add_argument("--dishes", type=int, default=1000)
+	parser.add_argument("--seed", type=int, default=0)
+	args = parser.parse_args()
+	write_catalogue(args.output, args.dishes, args.seed)
+
+
+if __name__ == "__main__":
+	main()
@@ -1,16 +1,30 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import pandas as pd
-import random
-import copy
-import json
+import concurrent.futures
+import datetime
+import io
+import itertools
 import os
 import shutil
+import sys
 from tkcalendar import Calendar
 from configparser import ConfigParser
+from diet_engine.instrument import Stats
+from diet_engine.pantry import format_pantry_item, parse_pantry_line
+from diet_engine.persist import shared_writer
+from diet_engine.selector import DishSelector
+from diet_engine.shopping import format_shopping_item, write_shopping_list
 # from PIL import Image, ImageTk  # 导入PIL库
 
 
+# 界面上的选项 -> DishSelector.pantry_mode
+PANTRY_MODES = {"不看库存": "off", "优先用库存": "prefer", "只用库存": "only"}
+
+# 配置文件放在程序旁边，不随启动时的工作目录变；打包成单个 exe 时 __file__ 在临时解压目录里，用 exe 所在目录
+APP_DIR = os.path.dirname(os.path.abspath(sys.executable if getattr(sys, 'frozen', False) else __file__))
+CONFIG_PATH = os.path.join(APP_DIR, 'config.ini')
+
+
 class ModernStyle:
 	@staticmethod
 	def configure_styles():
@@ -66,180 +80,77 @@ class ModernStyle:
 		                background='white')
 
 
-class DishSelector:
-	dish_weights = {}
-
-	def __init__(self, excel_file, recent_days=3, penalty=0.3, long_term_reward=1.01):
-		self.excel_file = excel_file
-		self.dishes = self.load_dishes_from_excel(excel_file)
-		self.recent_dishes = []
-		self.recent_days = recent_days
-		self.penalty = penalty
-		self.long_term_reward = long_term_reward
-		self.difficulty_mapping = {"易": 1, "中": 0.9, "难": 0.8}
-		self.daily_nutrition_target = {}
-		self.initialize_dish_weights()
-		self.history_file = self.get_history_file_path(excel_file)
-		self.history_menus = {}
-		self.load_history()
-		self.previous_selected_dishes = []
-		self.ingredient_inventory = {}
-		self.inventory_file = self.get_inventory_file_path(excel_file)
-		self.load_inventory()
-
-	def get_history_file_path(self, excel_path):
-		base_name = os.path.splitext(os.path.basename(excel_path))[0]
-		return os.path.join("data", f"{base_name}_history.txt")
-
-	def load_history(self):
-		try:
-			if os.path.exists(self.history_file):
-				with open(self.history_file, 'r', encoding='utf-8') as f:
-					self.history_menus = json.load(f)
-		except Exception as e:
-			print(f"加载历史记录失败: {e}")
-			self.history_menus = {}
-
-	def get_inventory_file_path(self, excel_path):
-		base_name = os.path.splitext(os.path.basename(excel_path))[0]
-		return os.path.join("data", f"{base_name}_inventory.json")
-
-	def load_inventory(self):
-		try:
-			if os.path.exists(self.inventory_file):
-				with open(self.inventory_file, 'r', encoding='utf-8') as f:
-					self.ingredient_inventory = json.load(f)
-		except Exception as e:
-			print(f"加载材料库失败: {e}")
-			self.ingredient_inventory = {}
-
-	def split_ingredients(self, ingredient_str):
-		return [ing.strip() for ing in ingredient_str.replace('，', ',').split(',')]
-
-	def update_ingredient_inventory(self, menu):
-		for dish in menu:
-			ingredients = self.split_ingredients(dish['main_ingredients'])
-			for ing in ingredients:
-				if ing in self.ingredient_inventory:
-					self.ingredient_inventory[ing]['count'] += 1
-					self.ingredient_inventory[ing]['total_amount'] += 1
-				else:
-					self.ingredient_inventory[ing] = {'count': 1, 'total_amount': 1}
-		self.save_inventory()
-
-	def save_inventory(self):
-		try:
-			os.makedirs(os.path.dirname(self.inventory_file), exist_ok=True)
-			with open(self.inventory_file, 'w', encoding='utf-8') as f:
-				json.dump(self.ingredient_inventory, f, ensure_ascii=False, indent=2)
-		except Exception as e:
-			print(f"保存材料库失败: {e}")
-
-	def load_dishes_from_excel(self, excel_file):
-		df = pd.read_excel(excel_file)
-		expected_columns = ['name', 'calories', 'protein', 'fat', 'carb', 'preference', 'difficulty',
-		                    'main_ingredients', 'side_ingredients', 'main_protein']
-		if not all(col in df.columns for col in expected_columns):
-			raise ValueError(f"Excel file must contain columns: {expected_columns}")
-		return df.to_dict('records')
-
-	def initialize_dish_weights(self):
-		if not DishSelector.dish_weights:
-			for dish in self.dishes:
-				DishSelector.dish_weights[dish['name']] = self.calculate_initial_weight(dish)
-
-	def calculate_initial_weight(self, dish):
-		return dish["preference"] * self.difficulty_mapping[dish["difficulty"]]
-
-	def update_weights(self):
-		for dish in self.dishes:
-			weight = DishSelector.dish_weights[dish['name']]
-			if dish["name"] in self.recent_dishes:
-				weight *= self.penalty
-			weight *= self.long_term_reward
-			DishSelector.dish_weights[dish['name']] = weight
-
-	def weighted_random_choice(self, dishes):
-		total_weight = sum(DishSelector.dish_weights[dish['name']] for dish in dishes)
-		if total_weight == 0:
-			return random.choice(dishes)
-		rand_val = random.uniform(0, total_weight)
-		cumulative_weight = 0
-		for dish in dishes:
-			cumulative_weight += DishSelector.dish_weights[dish['name']]
-			if rand_val <= cumulative_weight:
-				return dish
-
-	def calculate_nutrition_gap(self, current_nutrition):
-		gap = {}
-		for nutrient in self.daily_nutrition_target:
-			gap[nutrient] = self.daily_nutrition_target[nutrient] - current_nutrition[nutrient]
-		return gap
-
-	def adjust_weights_for_nutrition(self, nutrition_gap):
-		for dish in self.dishes:
-			for nutrient, gap in nutrition_gap.items():
-				if gap > 0:
-					DishSelector.dish_weights[dish['name']] += dish[nutrient] * (
-						0.1 if nutrient == "protein" else 0.05 if nutrient == "fat" else 0.08)
-
-	def generate_daily_menu(self, daily_nutrition_target, regenerate=False):
-		self.daily_nutrition_target = daily_nutrition_target
-		self.update_weights()
-
-		if regenerate:
-			for dish in self.previous_selected_dishes:
-				DishSelector.dish_weights[dish['name']] *= 0.7
-
-		lunch = self.weighted_random_choice(self.dishes)
-		self.recent_dishes.append(lunch["name"])
-		if len(self.recent_dishes) > self.recent_days:
-			self.recent_dishes.pop(0)
-
-		current_nutrition = {
-			"protein": lunch["protein"],
-			"fat": lunch["fat"],
-			"carb": lunch["carb"]
-		}
-		nutrition_gap = self.calculate_nutrition_gap(current_nutrition)
-		self.adjust_weights_for_nutrition(nutrition_gap)
-
-		available_dishes_for_dinner = [
-			dish for dish in self.dishes
-			if dish["name"] != lunch["name"] and dish["main_protein"] != lunch["main_protein"]
-		]
-
-		if not available_dishes_for_dinner:
-			available_dishes_for_dinner = [dish for dish in self.dishes if dish["name"] != lunch["name"]]
-
-		dinner = self.weighted_random_choice(available_dishes_for_dinner)
-		self.recent_dishes.append(dinner["name"])
-		if len(self.recent_dishes) > self.recent_days:
-			self.recent_dishes.pop(0)
-
-		selected_dishes = [lunch, dinner]
-		self.previous_selected_dishes = selected_dishes
-
-		DishSelector.dish_weights[lunch['name']] *= 1.05
-		DishSelector.dish_weights[dinner['name']] *= 1.05
-
-		return selected_dishes
-
-	def add_menu_to_history(self, date_str, menu):
-		self.history_menus[date_str] = copy.deepcopy(menu)
-		self.save_history()
-		self.update_ingredient_inventory(menu)
-
-	def get_menu_by_date(self, date_str):
-		return self.history_menus.get(date_str)
+class BackgroundRunner:
+	def __init__(self, master, on_busy_change=None, poll_interval=50):
+		self.master = master
+		self.on_busy_change = on_busy_change
+		self.poll_interval = poll_interval
+		# 单个工作线程：选菜、读写文件按提交顺序执行，界面线程只负责展示结果
+		self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="gui-worker")
+		self.jobs = []
+		self.latest = {}
+		self.pending = {}
+		self.tokens = itertools.count()
+		self.polling = False
+
+	def submit(self, kind, fn, on_done, on_error=None, coalesce=False, keep_stale=False):
+		# 同一类任务只展示最新一次的结果；coalesce 时正在运行的任务结束前，多次点击只保留最后一次
+		if coalesce and any(job[0] == kind for job in self.jobs):
+			self.pending[kind] = (fn, on_done, on_error)
+			return
+		token = next(self.tokens)
+		if not keep_stale:
+			self.latest[kind] = token
+			for job in self.jobs:
+				if job[0] == kind:
+					job[2].cancel()
+		self.jobs.append((kind, token, self.executor.submit(fn), on_done, on_error, keep_stale))
+		self.start_polling()
+
+	def invalidate(self, kind):
+		self.latest[kind] = next(self.tokens)
+		self.pending.pop(kind, None)
+		for job in self.jobs:
+			if job[0] == kind:
+				job[2].cancel()
+
+	def start_polling(self):
+		if not self.polling:
+			self.polling = True
+			if self.on_busy_change:
+				self.on_busy_change(True)
+			self.master.after(self.poll_interval, self.poll)
+
+	def poll(self):
+		finished = [job for job in self.jobs if job[2].done()]
+		self.jobs = [job for job in self.jobs if not job[2].done()]
+		for kind, token, future, on_done, on_error, keep_stale in finished:
+			stale = not keep_stale and (self.latest.get(kind) != token or kind in self.pending)
+			if future.cancelled() or stale:
+				continue
+			error = future.exception()
+			if error is None:
+				on_done(future.result())
+			elif on_error:
+				on_error(error)
+			else:
+				print(f"后台任务失败: {error}")
+
+		for kind in list(self.pending):
+			if not any(job[0] == kind for job in self.jobs):
+				fn, on_done, on_error = self.pending.pop(kind)
+				self.submit(kind, fn, on_done, on_error)
+
+		if self.jobs:
+			self.master.after(self.poll_interval, self.poll)
+		else:
+			self.polling = False
+			if self.on_busy_change:
+				self.on_busy_change(False)
 
-	def save_history(self):
-		try:
-			os.makedirs(os.path.dirname(self.history_file), exist_ok=True)
-			with open(self.history_file, 'w', encoding='utf-8') as f:
-				json.dump(self.history_menus, f, ensure_ascii=False, indent=2)
-		except Exception as e:
-			print(f"保存历史记录失败: {e}")
+	def shutdown(self):
+		self.pending.clear()
+		self.executor.shutdown(wait=True)
 
 
 class NutritionTargetFrame(ttk.Frame):
@@ -323,20 +234,37 @@ class MenuApp:
 
 		self.selector = None
 		self.current_generated_menu = None
+		self.menu_candidates = []
+		self.candidate_index = 0
+		self.candidate_target = None
 		self.default_nutrition = {
 			"protein": 70,
 			"fat": 50,
 			"carb": 100
 		}
 		self.last_excel_path = ""
+		# 用户选的原始食谱文件；data 目录里的是它的备份，原文件改了会自动同步并重新加载
+		self.source_excel_path = ""
+		self.watched_signature = None
+		self.pending_signature = None
+		self.watch_interval = 2000
 		self.load_config()
 		self.create_widgets()
+		self.runner = BackgroundRunner(master, on_busy_change=self.set_busy)
+		master.protocol("WM_DELETE_WINDOW", self.on_close)
+		# 调试面板默认隐藏，Ctrl+Shift+D 打开后才开始统计耗时
+		self.stats = Stats()
+		self.debug_window = None
+		master.bind("<Control-Shift-D>", lambda e: self.toggle_debug_panel())
 		self.try_load_last_excel()
+		self.master.after(self.watch_interval, self.watch_catalogue)
 		self.inventory_visible = False
 
 		# 在NutritionTargetFrame后创建材料库按钮
 		# self.create_inventory_button() # 移到create_widgets里
 		self.create_inventory_widgets()
+		self.shopping_visible = False
+		self.create_shopping_widgets()
 
 	def create_widgets(self):
 
@@ -351,8 +279,24 @@ class MenuApp:
 		                                        command=self.toggle_inventory,
 		                                        style='Secondary.TButton')
 
+		self.show_shopping_button = ttk.Button(self.top_button_frame,
+		                                       text="显示/隐藏购物清单",
+		                                       command=self.toggle_shopping,
+		                                       style='Secondary.TButton')
+
+		self.edit_pantry_button = ttk.Button(self.top_button_frame,
+		                                     text="编辑库存",
+		                                     command=self.edit_pantry,
+		                                     style='Secondary.TButton')
+
 		self.select_file_button.pack(side=tk.LEFT, expand=True, fill='x', padx=(0, 5))  # 左侧，填充x方向
-		self.show_inventory_button.pack(side=tk.LEFT, expand=True, fill='x', padx=(5, 0))  # 右侧, 填充x方向
+		self.show_inventory_button.pack(side=tk.LEFT, expand=True, fill='x', padx=5)
+		self.show_shopping_button.pack(side=tk.LEFT, expand=True, fill='x', padx=5)
+		self.edit_pantry_button.pack(side=tk.LEFT, expand=True, fill='x', padx=(5, 0))  # 右侧, 填充x方向
+		self.watch_var = tk.BooleanVar(value=True)
+		ttk.Checkbutton(self.top_button_frame,
+		                text="自动重新加载",
+		                variable=self.watch_var).pack(side=tk.LEFT, padx=(10, 0))
 		self.top_button_frame.grid(row=0, column=0, columnspan=2, sticky='ew', pady=(0, 5))
 
 		# 设置权重，使得select_file_button占2/3，show_inventory_button占1/3
@@ -361,6 +305,20 @@ class MenuApp:
 
 		# 2. 营养目标输入框
 		self.nutrition_frame = NutritionTargetFrame(self.main_frame, self.default_nutrition)
+		self.nutrition_match_var = tk.BooleanVar(value=False)
+		ttk.Checkbutton(self.nutrition_frame,
+		                text="营养匹配",
+		                variable=self.nutrition_match_var).pack(side=tk.LEFT, padx=10)
+		self.nutrition_search_var = tk.BooleanVar(value=False)
+		ttk.Checkbutton(self.nutrition_frame,
+		                text="多组择优",
+		                variable=self.nutrition_search_var).pack(side=tk.LEFT)
+		self.pantry_mode_var = tk.StringVar(value="不看库存")
+		ttk.Combobox(self.nutrition_frame,
+		             textvariable=self.pantry_mode_var,
+		             values=list(PANTRY_MODES),
+		             state='readonly',
+		             width=12).pack(side=tk.LEFT, padx=10)
 		self.nutrition_frame.grid(row=1, column=0, sticky='ew', pady=(0, 5))
 
 		# 3. 生成和重新生成按钮
@@ -375,8 +333,28 @@ class MenuApp:
 		                                    command=lambda: self.generate_menu(regenerate=True),
 		                                    style='Main.TButton',
 		                                    state=tk.DISABLED)
+		self.next_button = ttk.Button(self.button_frame,
+		                              text="换一组",
+		                              command=self.next_candidate,
+		                              style='Secondary.TButton',
+		                              state=tk.DISABLED)
+		self.plan_days_var = tk.StringVar(value="7")
+		self.plan_days_spinbox = ttk.Spinbox(self.button_frame,
+		                                     from_=1,
+		                                     to=90,
+		                                     textvariable=self.plan_days_var,
+		                                     width=4)
+		self.plan_button = ttk.Button(self.button_frame,
+		                              text="按天数填充",
+		                              command=self.generate_plan,
+		                              style='Secondary.TButton',
+		                              state=tk.DISABLED)
+		self.busy_bar = ttk.Progressbar(self.button_frame, mode='indeterminate', length=60)
 		self.generate_button.pack(side='left', padx=5, expand=True, fill='x')
 		self.regenerate_button.pack(side='left', padx=5, expand=True, fill='x')
+		self.next_button.pack(side='left', padx=5)
+		self.plan_days_spinbox.pack(side='left', padx=(5, 0))
+		self.plan_button.pack(side='left', padx=5)
 		self.button_frame.grid(row=2, column=0, sticky='ew', pady=(0, 5))
 
 		# 4. 菜单展示区域
@@ -429,6 +407,18 @@ class MenuApp:
 		self.cal.grid(row=5, column=0, sticky='nsew', pady=(0, 5))
 		self.cal.bind("<<CalendarSelected>>", lambda e: self.show_history())
 
+		# 日历右侧的营养统计，随选中日期和每次确认更新
+		self.analytics_text = tk.Text(self.main_frame,
+		                              width=30,
+		                              font=('Segoe UI', 10),
+		                              bg='white',
+		                              fg='#4A5568',
+		                              relief='flat',
+		                              padx=10,
+		                              pady=10)
+		self.analytics_text.grid(row=5, column=1, sticky='nsew', padx=(5, 0), pady=(0, 5))
+		self.analytics_text.config(state=tk.DISABLED)
+
 		# 7. 历史记录文本框
 		self.history_text = tk.Text(self.main_frame,
 		                            height=8,
@@ -474,12 +464,101 @@ class MenuApp:
 		else:
 			self.inventory_text.grid_remove()
 
+	def create_shopping_widgets(self):
+		self.shopping_frame = ttk.Frame(self.main_frame, style='TFrame')
+		self.shopping_text = tk.Text(self.shopping_frame,
+		                             height=8,
+		                             font=('Segoe UI', 11),
+		                             bg='white',
+		                             fg='#4A5568',
+		                             relief='flat',
+		                             padx=10,
+		                             pady=10)
+		self.export_shopping_button = ttk.Button(self.shopping_frame,
+		                                         text="导出购物清单",
+		                                         command=self.export_shopping_list,
+		                                         style='Secondary.TButton')
+		self.shopping_text.pack(fill='both', expand=True)
+		self.export_shopping_button.pack(fill='x', pady=(5, 0))
+		self.shopping_frame.grid(row=8, column=0, sticky='nsew', pady=(0, 10))
+		self.shopping_frame.grid_remove()  # 初始状态隐藏
+
+		self.main_frame.rowconfigure(8, weight=0)  # 购物清单
+
+	def toggle_shopping(self):
+		self.shopping_visible = not self.shopping_visible
+		if self.shopping_visible:
+			self.show_shopping_list()
+			self.shopping_frame.grid()
+		else:
+			self.shopping_frame.grid_remove()
+
+	def shopping_range(self):
+		# 从日历选中的日期开始，天数和“按天数填充”共用
+		start_date = self.cal.selection_get() or datetime.date.today()
+		try:
+			days = max(int(self.plan_days_var.get()), 1)
+		except ValueError:
+			days = 7
+		return start_date, start_date + datetime.timedelta(days=days - 1)
+
+	def show_shopping_list(self):
+		start_date, end_date = self.shopping_range()
+		shopping_str = f"购物清单（{start_date} ~ {end_date}）：\n\n"
+		if not self.selector:
+			self.render_shopping_list(shopping_str)
+			return
+
+		def listed(items):
+			self.render_shopping_list(
+				shopping_str + ("\n".join(format_shopping_item(item) for item in items) or "该日期范围内没有菜单"))
+
+		# 选菜方法都要拿 selector.lock，放到后台线程里，后台在批量生成时界面也不会卡住
+		self.runner.submit("shopping", lambda: self.selector.shopping_list(start_date, end_date), listed, coalesce=True)
+
+	def render_shopping_list(self, shopping_str):
+		self.shopping_text.config(state=tk.NORMAL)
+		self.shopping_text.delete("1.0", tk.END)
+		self.shopping_text.insert(tk.END, shopping_str)
+		self.shopping_text.config(state=tk.DISABLED)
+
+	def export_shopping_list(self):
+		if not self.selector:
+			messagebox.showwarning("警告", "请先选择Excel文件")
+			return
+		path = filedialog.asksaveasfilename(
+			title="导出购物清单",
+			defaultextension=".csv",
+			filetypes=[("CSV 文件", "*.csv"), ("JSON 文件", "*.json")]
+		)
+		if path:
+			start_date, end_date = self.shopping_range()
+			self.runner.submit("export", lambda: write_shopping_list(self.selector.shopping_list(start_date, end_date), path),
+			                   lambda _: messagebox.showinfo("成功", "购物清单已导出"),
+			                   lambda e: messagebox.showerror("错误", f"导出失败: {e}"), keep_stale=True)
+
 	def show_inventory(self):
-		inventory_str = "材料库：\n\n"
-		if self.selector:
-			for ingredient, data in self.selector.ingredient_inventory.items():
+		if not self.selector:
+			self.render_inventory("材料库：\n\n")
+			return
+
+		def report():
+			# 在后台线程里拼好文字；库存和材料库只在后台线程里改，这里读也不会和保存撞上
+			selector = self.selector
+			inventory_str = "材料库：\n\n"
+			if selector.pantry:
+				inventory_str = "库存：" + "、".join(format_pantry_item(name, item)
+				                                    for name, item in selector.pantry.items()) + "\n\n" + inventory_str
+			for ingredient, data in selector.ingredient_inventory.items():
 				inventory_str += f"{ingredient}: 使用次数 {data['count']}, 总量 {data['total_amount']}\n"
+				dish_names = [dish['name'] for dish in selector.dishes_using(ingredient)]
+				if dish_names:
+					inventory_str += f"    可用于：{'、'.join(dish_names)}\n"
+			return inventory_str
 
+		self.runner.submit("inventory", report, self.render_inventory, coalesce=True)
+
+	def render_inventory(self, inventory_str):
 		self.inventory_text.config(state=tk.NORMAL)
 		self.inventory_text.delete("1.0", tk.END)
 		self.inventory_text.insert(tk.END, inventory_str)
@@ -487,57 +566,199 @@ class MenuApp:
 
 	def load_config(self):
 		self.config = ConfigParser()
-		self.config.read('config.ini')
+		try:
+			self.config.read(CONFIG_PATH, encoding='utf-8')
+		except UnicodeDecodeError:
+			# 旧版按系统默认编码写的配置
+			self.config.read(CONFIG_PATH)
 		if 'DEFAULT' in self.config:
 			self.last_excel_path = self.config['DEFAULT'].get('last_excel', '')
+			self.source_excel_path = self.config['DEFAULT'].get('source_excel', '')
 
 	def save_config(self):
-		self.config['DEFAULT'] = {'last_excel': self.last_excel_path}
-		with open('../config.ini', 'w') as configfile:
-			self.config.write(configfile)
+		self.config['DEFAULT'] = {'last_excel': self.last_excel_path, 'source_excel': self.source_excel_path}
+		# 和 load_config 读的是同一个文件；先写临时文件再替换，写到一半退出也不会弄坏配置
+		configfile = io.StringIO()
+		self.config.write(configfile)
+		data = configfile.getvalue()
+		shared_writer().schedule(CONFIG_PATH, lambda: data)
 
 	def backup_excel_file(self, src_path):
 		try:
 			os.makedirs("data", exist_ok=True)
 			dst_path = os.path.join("data", os.path.basename(src_path))
-			if not os.path.exists(dst_path):
+			# 原文件比备份新（改过）时重新备份
+			if not os.path.exists(dst_path) or os.path.getmtime(src_path) > os.path.getmtime(dst_path):
 				shutil.copyfile(src_path, dst_path)
 			return dst_path
 		except Exception as e:
 			messagebox.showerror("错误", f"文件备份失败: {e}")
 			return src_path
 
+	def set_busy(self, busy):
+		if busy:
+			self.busy_bar.pack(side='left', padx=5)
+			self.busy_bar.start(10)
+			self.master.config(cursor='watch')
+		else:
+			self.busy_bar.stop()
+			self.busy_bar.pack_forget()
+			self.master.config(cursor='')
+
+	def toggle_debug_panel(self):
+		if self.debug_window is not None:
+			self.close_debug_panel()
+			return
+		self.stats.enabled = True
+		self.debug_window = tk.Toplevel(self.master)
+		self.debug_window.title("性能统计")
+		self.debug_window.protocol("WM_DELETE_WINDOW", self.close_debug_panel)
+
+		self.debug_text = tk.Text(self.debug_window, width=80, height=24, font=('Consolas', 10))
+		self.debug_text.pack(fill='both', expand=True, padx=10, pady=(10, 5))
+		debug_buttons = ttk.Frame(self.debug_window, style='TFrame')
+		ttk.Button(debug_buttons, text="刷新", command=self.refresh_debug_panel,
+		           style='Secondary.TButton').pack(side=tk.LEFT, padx=5)
+		ttk.Button(debug_buttons, text="清零", command=lambda: (self.stats.reset(), self.refresh_debug_panel()),
+		           style='Secondary.TButton').pack(side=tk.LEFT, padx=5)
+		self.profile_button = ttk.Button(debug_buttons, text="开始 cProfile", command=self.toggle_profile,
+		                                 style='Secondary.TButton')
+		self.profile_button.pack(side=tk.LEFT, padx=5)
+		ttk.Button(debug_buttons, text="导出 JSON", command=self.export_stats,
+		           style='Secondary.TButton').pack(side=tk.LEFT, padx=5)
+		debug_buttons.pack(fill='x', padx=10, pady=(0, 10))
+		self.refresh_debug_panel()
+
+	def close_debug_panel(self):
+		self.stats.enabled = False
+		self.stats.stop_profile()
+		self.debug_window.destroy()
+		self.debug_window = None
+
+	def refresh_debug_panel(self, extra=""):
+		self.debug_text.config(state=tk.NORMAL)
+		self.debug_text.delete("1.0", tk.END)
+		self.debug_text.insert(tk.END, self.stats.report() + ("\n\n" + extra if extra else ""))
+		self.debug_text.config(state=tk.DISABLED)
+
+	def toggle_profile(self):
+		if self.stats.profiler is None:
+			self.stats.start_profile()
+			self.profile_button.config(text="停止 cProfile")
+		else:
+			self.profile_button.config(text="开始 cProfile")
+			self.refresh_debug_panel(self.stats.stop_profile())
+
+	def export_stats(self):
+		path = filedialog.asksaveasfilename(title="导出性能统计", defaultextension=".json",
+		                                    filetypes=[("JSON 文件", "*.json")])
+		if path:
+			self.stats.dump(path)
+
+	def on_close(self):
+		# 等后台的保存任务写完再退出
+		self.runner.shutdown()
+		if self.selector:
+			self.selector.close()
+		shared_writer().flush()
+		self.master.destroy()
+
+	def catalogue_signature(self, path):
+		try:
+			stat = os.stat(path)
+		except OSError:
+			return None
+		return stat.st_mtime_ns, stat.st_size
+
+	def watch_catalogue(self):
+		# 定时看一眼食谱源文件的修改时间和大小；连续两次相同（已经保存完）才重新加载
+		self.master.after(self.watch_interval, self.watch_catalogue)
+		if not self.watch_var.get() or not self.selector:
+			return
+		path = self.source_excel_path or self.selector.excel_file
+		signature = self.catalogue_signature(path)
+		if signature is None or signature == self.watched_signature:
+			self.pending_signature = None
+			return
+		if signature != self.pending_signature:
+			self.pending_signature = signature
+			return
+		self.watched_signature = signature
+		self.pending_signature = None
+		self.reload_catalogue(path)
+
+	def reload_catalogue(self, source_path):
+		selector = self.selector
+
+		def reload():
+			if os.path.abspath(source_path) != os.path.abspath(selector.excel_file):
+				shutil.copyfile(source_path, selector.excel_file)
+			return selector.reload_if_changed()
+
+		def reloaded(diff):
+			if not diff or selector is not self.selector or not any(diff.values()):
+				return
+			self.master.title(f"每日菜单推荐 - 食谱已更新：新增 {len(diff['added'])} 道，"
+			                  f"删除 {len(diff['removed'])} 道，修改 {len(diff['changed'])} 道")
+			self.show_history()
+
+		self.runner.submit("reload", reload, reloaded,
+		                   lambda e: messagebox.showwarning("提示", f"重新加载食谱失败，请检查文件后再保存一次:\n{e}"),
+		                   keep_stale=True)
+
+	def load_selector(self, excel_path, message):
+		self.watched_signature = self.catalogue_signature(self.source_excel_path or excel_path)
+
+		def loaded(selector):
+			# 后台任务都在执行时才读 self.selector，换过之后排队中的任务用的就是新实例；
+			# 旧实例的关闭也排进后台队列，等已经在跑的任务结束后再关
+			old, self.selector = self.selector, selector
+			if old:
+				self.runner.submit("close", old.close, lambda _: None, keep_stale=True)
+			self.generate_button.config(state=tk.NORMAL)
+			self.regenerate_button.config(state=tk.NORMAL)
+			self.confirm_button.config(state=tk.NORMAL)
+			self.plan_button.config(state=tk.NORMAL)
+			self.lunch_label.config(text="")
+			self.dinner_label.config(text="")
+			self.current_generated_menu = None
+			self.menu_candidates = []
+			self.next_button.config(state=tk.DISABLED, text="换一组")
+			if selector.import_bad_rows:
+				details = "\n".join(selector.import_errors[:10])
+				messagebox.showwarning("提示", f"{message}\n\n有 {selector.import_bad_rows} 行格式有误，已跳过:\n{details}")
+			else:
+				messagebox.showinfo("提示", message)
+			self.show_history()
+
+		# 换文件后，旧食谱上还没回来的生成结果都作废
+		self.runner.invalidate("generate")
+		def create():
+			selector = DishSelector(excel_path, stats=self.stats)
+			# 统计用的时间索引也在后台建好
+			selector.nutrition_timeline()
+			return selector
+
+		self.runner.submit("load", create, loaded,
+		                   lambda e: messagebox.showerror("错误", f"加载食谱文件失败:\n{e}"))
+
 	def try_load_last_excel(self):
 		if self.last_excel_path and os.path.exists(self.last_excel_path):
-			try:
-				self.selector = DishSelector(self.last_excel_path)
-				self.generate_button.config(state=tk.NORMAL)
-				self.regenerate_button.config(state=tk.NORMAL)
-				self.confirm_button.config(state=tk.NORMAL)
-				messagebox.showinfo("提示", f"已自动加载上次的菜单文件: {os.path.basename(self.last_excel_path)}")
-			except Exception as e:
-				messagebox.showerror("错误", f"自动加载失败: {e}")
+			self.load_selector(self.last_excel_path,
+			                   f"已自动加载上次的菜单文件: {os.path.basename(self.last_excel_path)}")
 
 	def select_excel_file(self):
 		file_path = filedialog.askopenfilename(
 			title="选择 Excel 文件",
-			filetypes=[("Excel 文件", "*.xlsx;*.xls")]
+			filetypes=[("食谱文件", "*.xlsx;*.xlsm;*.xls;*.csv;*.jsonl"), ("Excel 文件", "*.xlsx;*.xlsm;*.xls"),
+			           ("CSV 文件", "*.csv"), ("JSON Lines 文件", "*.jsonl")]
 		)
 		if file_path:
-			try:
-				backed_path = self.backup_excel_file(file_path)
-				self.last_excel_path = backed_path
-				self.save_config()
-
-				self.selector = DishSelector(backed_path)
-				self.generate_button.config(state=tk.NORMAL)
-				self.regenerate_button.config(state=tk.NORMAL)
-				self.confirm_button.config(state=tk.NORMAL)
-				self.lunch_label.config(text="")
-				self.dinner_label.config(text="")
-				messagebox.showinfo("提示", "文件已自动备份到data目录")
-			except Exception as e:
-				messagebox.showerror("错误", f"加载 Excel 文件失败:\n{e}")
+			backed_path = self.backup_excel_file(file_path)
+			self.source_excel_path = file_path if backed_path != file_path else ""
+			self.last_excel_path = backed_path
+			self.save_config()
+			self.load_selector(backed_path, "文件已自动备份到data目录")
 
 	def generate_menu(self, regenerate=False):
 		nutrition_target = self.nutrition_frame.get_values()
@@ -545,43 +766,175 @@ class MenuApp:
 			messagebox.showerror("错误", "请输入有效的营养目标值")
 			return
 
+		if not self.selector:
+			messagebox.showerror("错误", "请先选择有效的Excel文件")
+			return
+
+		self.apply_nutrition_mode()
+		# 按日历上选中的日期套用排除规则（例如周一吃素）
+		date = self.cal.selection_get() or datetime.date.today()
+		# 连续点击“重新生成”时合并成一次
+		self.runner.submit("generate",
+		                   lambda: self.selector.generate_menu_candidates(nutrition_target, regenerate=regenerate, date=date),
+		                   lambda candidates: self.show_candidates(candidates, nutrition_target),
+		                   lambda e: messagebox.showerror("错误", f"生成菜单失败: {e}"),
+		                   coalesce=True)
+
+	def show_candidates(self, candidates, nutrition_target):
+		# “多组择优”会给出按得分排好的几组，点“换一组”在里面轮换，不重新抽
+		self.menu_candidates = candidates
+		self.candidate_index = 0
+		self.candidate_target = nutrition_target
+		self.show_candidate()
+
+	def next_candidate(self):
+		if len(self.menu_candidates) > 1:
+			self.candidate_index = (self.candidate_index + 1) % len(self.menu_candidates)
+			self.show_candidate()
+
+	def show_candidate(self):
+		count = len(self.menu_candidates)
+		if count > 1:
+			self.next_button.config(state=tk.NORMAL, text=f"换一组 ({self.candidate_index + 1}/{count})")
+		else:
+			self.next_button.config(state=tk.DISABLED, text="换一组")
+		self.display_menu(self.menu_candidates[self.candidate_index], self.candidate_target)
+
+	def display_menu(self, selected_dishes, nutrition_target):
+		self.current_generated_menu = selected_dishes
+		self.stats.count("gui_menus_shown")
+
+		self.lunch_label.config(
+			text=f"午餐：{selected_dishes[0]['name']} ({selected_dishes[0]['main_protein']})")
+		self.dinner_label.config(
+			text=f"晚餐：{selected_dishes[1]['name']} ({selected_dishes[1]['main_protein']})")
+
+		total = {
+			"protein": selected_dishes[0]['protein'] + selected_dishes[1]['protein'],
+			"fat": selected_dishes[0]['fat'] + selected_dishes[1]['fat'],
+			"carb": selected_dishes[0]['carb'] + selected_dishes[1]['carb']
+		}
+
+		protein_percent = (total['protein'] / nutrition_target['protein']) * 100
+		fat_percent = (total['fat'] / nutrition_target['fat']) * 100
+		carb_percent = (total['carb'] / nutrition_target['carb']) * 100
+
+		self.menu_right.update_progress(protein_percent, fat_percent, carb_percent)
+
+	def edit_pantry(self):
+		if not self.selector:
+			messagebox.showwarning("警告", "请先选择Excel文件")
+			return
+		window = tk.Toplevel(self.master)
+		window.title("库存")
+		ttk.Label(window, text="每行一种食材，例如“鸡蛋 6个”、“牛肉 500g”；只写名字表示有但不计量").pack(
+			fill='x', padx=10, pady=(10, 5))
+		pantry_text = tk.Text(window, width=40, height=16, font=('Segoe UI', 11))
+		pantry_text.pack(fill='both', expand=True, padx=10)
+		self.runner.submit("pantry_text",
+		                   lambda: "\n".join(format_pantry_item(name, item) for name, item in self.selector.pantry.items()),
+		                   lambda text: pantry_text.insert("1.0", text) if pantry_text.winfo_exists() else None,
+		                   keep_stale=True)
+		status_label = ttk.Label(window, text="")
+		status_label.pack(fill='x', padx=10, pady=5)
+
+		def save():
+			pantry = dict(parse_pantry_line(line) for line in pantry_text.get("1.0", tk.END).splitlines() if line.strip())
+
+			def saved(count):
+				status_label.config(text=f"已保存，主料齐全的菜有 {count} 道")
+				if self.inventory_visible:
+					self.show_inventory()
+
+			def apply():
+				selector = self.selector
+				selector.set_pantry(pantry)
+				return len(selector.cookable_dishes())
+
+			self.runner.submit("pantry", apply, saved, lambda e: messagebox.showerror("错误", f"保存库存失败: {e}"),
+			                   keep_stale=True)
+
+		pantry_buttons = ttk.Frame(window, style='TFrame')
+		ttk.Button(pantry_buttons, text="保存", command=save, style='Main.TButton').pack(side=tk.LEFT, padx=5)
+		ttk.Button(pantry_buttons, text="关闭", command=window.destroy,
+		           style='Secondary.TButton').pack(side=tk.LEFT, padx=5)
+		pantry_buttons.pack(fill='x', padx=10, pady=(0, 10))
+
+	def apply_nutrition_mode(self):
+		self.selector.pantry_mode = PANTRY_MODES[self.pantry_mode_var.get()]
+		if self.nutrition_search_var.get():
+			self.selector.nutrition_mode = "search"
+		else:
+			self.selector.nutrition_mode = "match" if self.nutrition_match_var.get() else "heuristic"
+
+	def generate_plan(self):
+		nutrition_target = self.nutrition_frame.get_values()
+		if not nutrition_target:
+			messagebox.showerror("错误", "请输入有效的营养目标值")
+			return
 		try:
-			selected_dishes = self.selector.generate_daily_menu(nutrition_target, regenerate=regenerate)
-			self.current_generated_menu = selected_dishes
-
-			self.lunch_label.config(
-				text=f"午餐：{selected_dishes[0]['name']} ({selected_dishes[0]['main_protein']})")
-			self.dinner_label.config(
-				text=f"晚餐：{selected_dishes[1]['name']} ({selected_dishes[1]['main_protein']})")
-
-			total = {
-				"protein": selected_dishes[0]['protein'] + selected_dishes[1]['protein'],
-				"fat": selected_dishes[0]['fat'] + selected_dishes[1]['fat'],
-				"carb": selected_dishes[0]['carb'] + selected_dishes[1]['carb']
-			}
+			days = int(self.plan_days_var.get())
+		except ValueError:
+			messagebox.showerror("错误", "请输入有效的天数")
+			return
+		start_date = self.cal.selection_get()
+		if not self.selector or not start_date or days < 1:
+			messagebox.showwarning("警告", "请先选择Excel文件和起始日期")
+			return
 
-			protein_percent = (total['protein'] / nutrition_target['protein']) * 100
-			fat_percent = (total['fat'] / nutrition_target['fat']) * 100
-			carb_percent = (total['carb'] / nutrition_target['carb']) * 100
 
-			self.menu_right.update_progress(protein_percent, fat_percent, carb_percent)
+		def planned(plan):
+			messagebox.showinfo("成功", f"已生成并保存 {len(plan)} 天的菜单！")
+			self.show_history()
 
-		except AttributeError:
-			messagebox.showerror("错误", "请先选择有效的Excel文件")
+		def checked(existing):
+			if existing and not messagebox.askyesno("确认", f"所选范围内已有 {len(existing)} 天的菜单，是否覆盖？"):
+				return
+			self.apply_nutrition_mode()
+			self.runner.submit("plan", lambda: self.selector.generate_plan(start_date, days, nutrition_target), planned,
+			                   lambda e: messagebox.showerror("错误", f"批量生成失败: {e}"), keep_stale=True)
+
+		# 先在后台查一下范围内已有的菜单，确认覆盖后再提交生成
+		end_date = start_date + datetime.timedelta(days=days - 1)
+		self.runner.submit("plan", lambda: self.selector.get_menus_between(start_date, end_date), checked,
+		                   lambda e: messagebox.showerror("错误", f"读取历史菜单失败: {e}"), keep_stale=True)
 
 	def confirm_menu(self):
 		selected_date = self.cal.get_date()
 		if self.current_generated_menu:
-			self.selector.add_menu_to_history(selected_date, self.current_generated_menu)
-			messagebox.showinfo("成功", f"{selected_date}的菜单已保存！")
-			self.show_history()
+			menu = self.current_generated_menu
+			date = self.cal.selection_get()
+
+			def confirmed(_):
+				messagebox.showinfo("成功", f"{selected_date}的菜单已保存！")
+				self.show_history()
+
+			def confirm():
+				selector = self.selector
+				# 多组择优时，最终选的这一组才记为最近吃过、上调权重
+				selector.select_menu(menu)
+				selector.add_menu_to_history(date, menu)
+
+			# 确认的保存任务不能被后来的操作作废
+			self.runner.submit("confirm", confirm, confirmed,
+			                   lambda e: messagebox.showerror("错误", f"保存菜单失败: {e}"), keep_stale=True)
 		else:
 			messagebox.showwarning("警告", "请先生成菜单再确认")
 
 	def show_history(self):
 		selected_date = self.cal.get_date()
-		menu = self.selector.get_menu_by_date(selected_date) if self.selector else None
+		date = self.cal.selection_get()
+		if self.selector and selected_date:
+			self.runner.submit("history", lambda: self.selector.get_menu_by_date(date),
+			                   lambda menu: self.render_history(selected_date, menu), coalesce=True)
+		else:
+			self.render_history(selected_date, None)
+
+		if self.shopping_visible:
+			self.show_shopping_list()
+		self.show_analytics()
 
+	def render_history(self, selected_date, menu):
 		self.history_text.config(state=tk.NORMAL)
 		self.history_text.delete("1.0", tk.END)
 
@@ -600,6 +953,40 @@ class MenuApp:
 		self.history_text.insert(tk.END, history_str)
 		self.history_text.config(state=tk.DISABLED)
 
+	def show_analytics(self):
+		date = self.cal.selection_get()
+		target = self.nutrition_frame.get_values() or {}
+		if self.selector and date:
+			self.runner.submit("analytics", lambda: self.selector.nutrition_summary(date),
+			                   lambda summary: self.render_analytics(date, summary, target), coalesce=True)
+		else:
+			self.render_analytics(date, None, target)
+
+	def render_analytics(self, date, summary, target):
+		self.analytics_text.config(state=tk.NORMAL)
+		self.analytics_text.delete("1.0", tk.END)
+		if summary is not None:
+			lines = [f"统计截至 {date}"]
+			for key, title in (("rolling_7", "近7天日均"), ("rolling_30", "近30天日均")):
+				average = summary[key]
+				lines.append(f"\n{title}（{average['days']} 天有记录）")
+				for nutrient, label in (("protein", "蛋白质"), ("fat", "脂肪"), ("carb", "碳水")):
+					line = f"  {label} {average[nutrient]:.0f}g"
+					if target.get(nutrient):
+						line += f" / {target[nutrient]:g}g（{average[nutrient] / target[nutrient] * 100:.0f}%）"
+					lines.append(line)
+				lines.append(f"  热量 {average['calories']:.0f} kcal")
+			for key, title in (("week", "本周合计"), ("month", "本月合计")):
+				totals = summary[key]
+				lines.append(f"\n{title}（{totals['days']} 天）")
+				lines.append(f"  蛋白质 {totals['protein']:.0f}g 脂肪 {totals['fat']:.0f}g 碳水 {totals['carb']:.0f}g")
+				lines.append(f"  热量 {totals['calories']:.0f} kcal")
+			if summary['dishes']:
+				lines.append("\n吃得最多的菜")
+				lines.extend(f"  {name} × {count}" for name, count in summary['dishes'])
+			self.analytics_text.insert(tk.END, "\n".join(lines))
+		self.analytics_text.config(state=tk.DISABLED)
+
 
 if __name__ == "__main__":
 	root = tk.Tk()
@@ -0,0 +1,20 @@
+import importlib
+
+# 只在真正用到时才导入子模块（以及 numpy / openpyxl），保证 import diet_engine 足够轻
+_exports = {
+	"DishSelector": "diet_engine.selector",
+	"WeightStore": "diet_engine.weights",
+	"FenwickSampler": "diet_engine.weights",
+	"MacroIndex": "diet_engine.nutrition",
+	"IngredientSignatures": "diet_engine.similarity",
+	"CatalogueCache": "diet_engine.catalogue",
+}
+
+__all__ = list(_exports)
+
+
+def __getattr__(name):
+	module = _exports.get(name)
+	if module is None:
+		raise AttributeError(f"module 'diet_engine' has no attribute '{name}'")
+	return getattr(importlib.import_module(module), name)
@@ -0,0 +1,88 @@
+import bisect
+import collections
+import datetime
+
+import numpy as np
+
+COLUMNS = ("protein", "fat", "carb", "calories")
+
+
+class NutritionTimeline:
+	def __init__(self, menus=()):
+		# menus 是按日期排好的 [(ISO 日期, 菜单)]；前缀和 prefix[i] 是前 i 天的合计，任意区间两次二分即可
+		self.dates = []
+		self.values = np.zeros((0, len(COLUMNS)))
+		self.prefix = np.zeros((1, len(COLUMNS)))
+		self.size = 0
+		self.day_dishes = {}
+		self.dish_counts = collections.Counter()
+		for date_iso, menu in menus:
+			self.add(date_iso, menu)
+
+	@staticmethod
+	def menu_values(menu):
+		return [sum(dish[col] for dish in menu) for col in COLUMNS]
+
+	def grow(self):
+		capacity = max(16, 2 * len(self.values))
+		values = np.zeros((capacity, len(COLUMNS)))
+		values[:self.size] = self.values[:self.size]
+		prefix = np.zeros((capacity + 1, len(COLUMNS)))
+		prefix[:self.size + 1] = self.prefix[:self.size + 1]
+		self.values, self.prefix = values, prefix
+
+	def add(self, date_iso, menu):
+		old = self.day_dishes.get(date_iso)
+		if old is not None:
+			self.dish_counts.subtract(old)
+		names = [dish['name'] for dish in menu]
+		self.day_dishes[date_iso] = names
+		self.dish_counts.update(names)
+
+		if self.size == len(self.values):
+			self.grow()
+		i = bisect.bisect_left(self.dates, date_iso)
+		if old is None and i == self.size:
+			# 通常是按时间顺序确认，追加到末尾只需要算一行前缀和
+			self.dates.append(date_iso)
+			self.values[i] = self.menu_values(menu)
+			self.prefix[i + 1] = self.prefix[i] + self.values[i]
+			self.size += 1
+			return
+		if old is None:
+			self.dates.insert(i, date_iso)
+			self.values[i + 1:self.size + 1] = self.values[i:self.size].copy()
+			self.size += 1
+		self.values[i] = self.menu_values(menu)
+		# 补录或改了以前的某天，从这一天起重算前缀和
+		self.prefix[i + 1:self.size + 1] = self.prefix[i] + np.cumsum(self.values[i:self.size], axis=0)
+
+	def totals(self, start, end):
+		# [start, end] 闭区间内有记录的天数和各营养素合计
+		lo = bisect.bisect_left(self.dates, start.isoformat())
+		hi = bisect.bisect_right(self.dates, end.isoformat())
+		hi = max(lo, hi)
+		total = self.prefix[hi] - self.prefix[lo]
+		result = {col: float(total[c]) for c, col in enumerate(COLUMNS)}
+		result['days'] = hi - lo
+		return result
+
+	def rolling_average(self, end, window):
+		# 截至 end 的 window 天里，有记录那几天的日均值
+		totals = self.totals(end - datetime.timedelta(days=window - 1), end)
+		days = totals['days']
+		average = {col: totals[col] / days if days else 0.0 for col in COLUMNS}
+		average['days'] = days
+		return average
+
+	def week_totals(self, date):
+		start = date - datetime.timedelta(days=date.weekday())
+		return self.totals(start, start + datetime.timedelta(days=6))
+
+	def month_totals(self, date):
+		start = date.replace(day=1)
+		end = (start + datetime.timedelta(days=32)).replace(day=1) - datetime.timedelta(days=1)
+		return self.totals(start, end)
+
+	def dish_frequency(self, top=None):
+		return [(name, count) for name, count in self.dish_counts.most_common(top) if count > 0]
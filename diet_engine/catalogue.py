@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+
+from diet_engine.importer import read_catalogue
+
+
+class CatalogueCache:
+	version = 3
+	columns = ['name', 'calories', 'protein', 'fat', 'carb', 'preference', 'difficulty',
+	           'main_ingredients', 'side_ingredients', 'main_protein']
+	text_columns = ['name', 'difficulty', 'main_ingredients', 'side_ingredients', 'main_protein']
+
+	def __init__(self, source_path, cache_path):
+		self.source_path = os.path.abspath(source_path)
+		self.cache_path = cache_path
+		self.digest = None
+		self.status = None
+		# 解析时跳过的行：前若干条说明和总行数
+		self.errors = []
+		self.bad_rows = 0
+		self.fingerprints = None
+
+	def file_digest(self):
+		sha1 = hashlib.sha1()
+		with open(self.source_path, 'rb') as f:
+			for chunk in iter(lambda: f.read(1 << 20), b''):
+				sha1.update(chunk)
+		return sha1.hexdigest()
+
+	def load(self):
+		# 缓存有效时直接返回 (菜品列表, 内容哈希)，否则重新解析食谱文件并写缓存
+		stat = os.stat(self.source_path)
+		meta, columns = self.read_cache()
+		if meta is not None and meta['source'] == self.source_path and meta['version'] == self.version:
+			self.errors, self.bad_rows = meta['errors'], meta['bad_rows']
+			if meta['mtime'] == stat.st_mtime_ns and meta['size'] == stat.st_size:
+				self.digest = meta['sha1']
+				self.status = "hit"
+				return self.to_records(columns), self.digest
+			self.digest = self.file_digest()
+			if meta['sha1'] == self.digest:
+				# 只是修改时间变了，内容没变
+				self.status = "refreshed"
+				self.write_cache(columns, stat)
+				return self.to_records(columns), self.digest
+		self.status = "compiled"
+		columns = self.compile()
+		self.write_cache(columns, stat)
+		return self.to_records(columns), self.digest
+
+	def read_cache(self):
+		if not os.path.exists(self.cache_path):
+			return None, None
+		try:
+			with np.load(self.cache_path, allow_pickle=False) as data:
+				meta = json.loads(str(data['meta']))
+				columns = {col: data[col] for col in self.columns + ['fingerprint']}
+			return meta, columns
+		except Exception as e:
+			print(f"读取食谱缓存失败: {e}")
+			return None, None
+
+	def compile(self):
+		columns, self.errors, self.bad_rows = read_catalogue(self.source_path, self.columns, self.text_columns)
+		if self.digest is None:
+			self.digest = self.file_digest()
+		return columns
+
+	def write_cache(self, columns, stat):
+		meta = {
+			'version': self.version,
+			'source': self.source_path,
+			'mtime': stat.st_mtime_ns,
+			'size': stat.st_size,
+			'sha1': self.digest,
+			'errors': self.errors,
+			'bad_rows': self.bad_rows
+		}
+		try:
+			os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+			with open(self.cache_path, 'wb') as f:
+				np.savez(f, meta=np.array(json.dumps(meta, ensure_ascii=False)), **columns)
+		except Exception as e:
+			print(f"保存食谱缓存失败: {e}")
+
+	def to_records(self, columns):
+		self.fingerprints = columns['fingerprint']
+		values = [columns[col].tolist() for col in self.columns]
+		# 主蛋白、难度只有少数几种取值，共用同一个字符串对象
+		for col in ('difficulty', 'main_protein'):
+			values[self.columns.index(col)] = [sys.intern(value) for value in values[self.columns.index(col)]]
+		return [Dish(dish_id, row) for dish_id, row in enumerate(zip(*values))]
+
+
+class Dish:
+	# 定长记录代替 dict，大食谱能省四成左右内存；仍然支持 dish['name'] 的写法
+	__slots__ = ['id'] + CatalogueCache.columns
+
+	def __init__(self, dish_id, values):
+		self.id = dish_id
+		for col, value in zip(CatalogueCache.columns, values):
+			setattr(self, col, value)
+
+	def __getitem__(self, key):
+		try:
+			return getattr(self, key)
+		except (AttributeError, TypeError):
+			raise KeyError(key)
+
+	def get(self, key, default=None):
+		return getattr(self, key, default)
+
+	def values(self):
+		return tuple(getattr(self, col) for col in CatalogueCache.columns)
+
+	def to_dict(self):
+		return {col: getattr(self, col) for col in CatalogueCache.columns}
+
+	def __repr__(self):
+		return f"Dish({self.id}, {self.name!r})"
+
+
+def dish_to_dict(obj):
+	# 给 json.dump 的 default 用
+	if isinstance(obj, Dish):
+		return obj.to_dict()
+	raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def missing_dish(name):
+	# 历史里记着、但当前食谱已经删掉的菜
+	dish = {col: '' for col in CatalogueCache.text_columns}
+	dish.update({col: 0 for col in CatalogueCache.columns if col not in CatalogueCache.text_columns})
+	dish['name'] = name
+	return dish
@@ -0,0 +1,141 @@
+import argparse
+import datetime
+import json
+import sys
+
+
+def parse_date(value):
+	try:
+		return datetime.date.fromisoformat(value)
+	except ValueError:
+		raise argparse.ArgumentTypeError(f"日期格式应为 YYYY-MM-DD: {value}")
+
+
+def build_parser():
+	parser = argparse.ArgumentParser(prog="diet", description="每日惊喜菜谱命令行工具")
+	commands = parser.add_subparsers(dest="command", required=True)
+
+	instrument = argparse.ArgumentParser(add_help=False)
+	instrument.add_argument("--stats", metavar="PATH", help="把各阶段耗时和计数写成 JSON（- 表示打印）")
+	instrument.add_argument("--profile", metavar="PATH", help="用 cProfile 记录整个命令，写入 .prof 文件")
+
+	generate = commands.add_parser("generate", parents=[instrument], help="生成一天或多天的菜单")
+	generate.add_argument("--excel", required=True, help="食谱文件（.xlsx / .csv / .jsonl）")
+	generate.add_argument("--date", type=parse_date, default=datetime.date.today(), help="起始日期，默认今天")
+	generate.add_argument("--days", type=int, default=1, help="生成天数")
+	generate.add_argument("--protein", type=float, default=70, help="每日蛋白质目标（g）")
+	generate.add_argument("--fat", type=float, default=50, help="每日脂肪目标（g）")
+	generate.add_argument("--carb", type=float, default=100, help="每日碳水目标（g）")
+	generate.add_argument("--mode", choices=["heuristic", "match", "search"], default="heuristic", help="营养选菜方式")
+	generate.add_argument("--candidates", type=int, default=256, help="search 模式每天抽取的候选组合数")
+	generate.add_argument("--scorer", choices=["weighted", "nutrition"], default="weighted",
+	                      help="search 模式的打分方式：营养偏差兼顾权重 / 只看营养偏差")
+	generate.add_argument("--workers", type=int, default=1, help="search 模式候选很多时使用的进程数")
+	generate.add_argument("--diversity", type=float, default=0.5,
+	                      help="和最近几天吃过的菜食材相同时抽中概率的折扣，0 表示不考虑")
+	generate.add_argument("--pantry", choices=["off", "prefer", "only"], default="off",
+	                      help="按 data/<食谱名>_pantry.json 里的库存选菜：优先或只选主料齐全的菜")
+	generate.add_argument("--save", action="store_true", help="写入历史记录和材料库")
+	generate.add_argument("--output", help="把菜单以 JSON 写入该文件，而不是打印")
+	generate.set_defaults(handler=run_generate)
+
+	shopping = commands.add_parser("shopping", parents=[instrument], help="按日期范围汇总购物清单")
+	shopping.add_argument("--excel", required=True, help="食谱文件（.xlsx / .csv / .jsonl）")
+	shopping.add_argument("--start", type=parse_date, default=datetime.date.today(), help="起始日期，默认今天")
+	shopping.add_argument("--days", type=int, default=7, help="统计天数")
+	shopping.add_argument("--output", help="导出为 CSV（或 .json）文件，而不是打印")
+	shopping.set_defaults(handler=run_shopping)
+
+	serve = commands.add_parser("serve", help="启动本地 HTTP 菜单服务")
+	serve.add_argument("--host", default="127.0.0.1")
+	serve.add_argument("--port", type=int, default=8765)
+	serve.add_argument("--workers", type=int, default=4, help="处理请求的工作线程数")
+	serve.add_argument("--cache-size", type=int, default=16, help="内存中最多保留的食谱实例数")
+	serve.add_argument("--catalogue-dir", default=".", help="允许访问的食谱文件目录")
+	serve.add_argument("--data-dir", default="data", help="各用户历史记录的根目录")
+	serve.set_defaults(handler=run_serve)
+	return parser
+
+
+def run_generate(args):
+	from diet_engine.catalogue import dish_to_dict
+	from diet_engine.selector import DishSelector
+
+	selector = DishSelector(args.excel, nutrition_mode=args.mode, stats=args.stats_collector,
+	                        search_candidates=args.candidates, search_scorer=args.scorer, search_workers=args.workers,
+	                        diversity_penalty=args.diversity, pantry_mode=args.pantry)
+	nutrition_target = {"protein": args.protein, "fat": args.fat, "carb": args.carb}
+	try:
+		plan = selector.generate_plan(args.date, args.days, nutrition_target, commit=args.save)
+	finally:
+		selector.close()
+
+	if args.output:
+		with open(args.output, 'w', encoding='utf-8') as f:
+			json.dump(plan, f, ensure_ascii=False, indent=2, default=dish_to_dict)
+		return 0
+
+	for date_str, (lunch, dinner) in plan.items():
+		print(f"{date_str} 午餐：{lunch['name']} ({lunch['main_protein']}) "
+		      f"晚餐：{dinner['name']} ({dinner['main_protein']})")
+	return 0
+
+
+def run_shopping(args):
+	from diet_engine.selector import DishSelector
+	from diet_engine.shopping import format_shopping_item, write_shopping_list
+
+	selector = DishSelector(args.excel, stats=args.stats_collector)
+	end = args.start + datetime.timedelta(days=args.days - 1)
+	try:
+		items = selector.shopping_list(args.start, end)
+	finally:
+		selector.close()
+
+	if args.output:
+		write_shopping_list(items, args.output)
+		return 0
+
+	print(f"{args.start} ~ {end} 购物清单：")
+	for item in items:
+		print(format_shopping_item(item))
+	return 0
+
+
+def run_serve(args):
+	from diet_engine.service import create_server
+
+	server = create_server(args.host, args.port, args.catalogue_dir, args.data_dir, args.workers, args.cache_size)
+	print(f"菜单服务已启动: http://{args.host}:{server.server_address[1]}")
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+		server.service.shutdown()
+	return 0
+
+
+def main(argv=None):
+	args = build_parser().parse_args(argv)
+	stats_path = getattr(args, "stats", None)
+	profile_path = getattr(args, "profile", None)
+	if stats_path or profile_path:
+		from diet_engine.instrument import Stats
+
+		args.stats_collector = Stats(enabled=bool(stats_path))
+		if profile_path:
+			args.stats_collector.start_profile()
+	else:
+		args.stats_collector = None
+	try:
+		return args.handler(args)
+	except (OSError, ValueError) as e:
+		print(f"错误: {e}", file=sys.stderr)
+		return 1
+	finally:
+		if profile_path:
+			args.stats_collector.stop_profile(profile_path)
+		if stats_path:
+			args.stats_collector.dump(stats_path)
@@ -0,0 +1,212 @@
+import bisect
+import datetime
+import json
+import os
+import sqlite3
+import threading
+
+from diet_engine.persist import dump_json, load_json, shared_writer
+
+# 旧版历史文件的键是日历控件按系统语言格式化的字符串，这里列出常见格式
+ISO_DATE_FORMAT = '%Y-%m-%d'
+LEGACY_DATE_FORMATS = (ISO_DATE_FORMAT, '%Y/%m/%d', '%m/%d/%y', '%m/%d/%Y', '%d.%m.%y', '%d.%m.%Y', '%Y.%m.%d',
+                       '%d/%m/%Y', '%Y年%m月%d日')
+
+
+def parse_date_formats(text):
+	# 每种能解析 text 的格式各自得到的 ISO 日期
+	results = {}
+	for date_format in LEGACY_DATE_FORMATS:
+		try:
+			results[date_format] = datetime.datetime.strptime(text, date_format).date().isoformat()
+		except ValueError:
+			continue
+	return results
+
+
+def normalize_date(value):
+	if isinstance(value, datetime.datetime):
+		return value.date().isoformat()
+	if isinstance(value, datetime.date):
+		return value.isoformat()
+	dates = set(parse_date_formats(str(value).strip()).values())
+	if len(dates) == 1:
+		return dates.pop()
+	if dates:
+		# 比如 01/03/2025 既可能是 1 月 3 日也可能是 3 月 1 日，不猜
+		raise ValueError(f"日期有歧义（可能是 {'、'.join(sorted(dates))}）: {value}")
+	raise ValueError(f"无法识别的日期: {value}")
+
+
+def normalize_legacy_dates(keys):
+	# 同一份旧文件是同一个日历控件写的，格式只有一种：用能解析所有非 ISO 键的格式，
+	# 13/03/2025 这样的键就能确定整份文件是日/月。几种格式都能解析且结果不同的键报告出来，不猜。
+	# 返回 (原键 -> ISO 日期, 分不清的键, 不认识的键)
+	parsed = {key: parse_date_formats(str(key).strip()) for key in keys}
+	legacy = [results for results in parsed.values() if results and ISO_DATE_FORMAT not in results]
+	shared = [date_format for date_format in LEGACY_DATE_FORMATS
+	          if legacy and all(date_format in results for results in legacy)]
+	dates, ambiguous, unknown = {}, [], []
+	for key, results in parsed.items():
+		options = {results[date_format] for date_format in shared if date_format in results} or set(results.values())
+		if len(options) == 1:
+			dates[key] = options.pop()
+		elif options:
+			ambiguous.append(key)
+		else:
+			unknown.append(key)
+	return dates, ambiguous, unknown
+
+
+def load_legacy_history(path):
+	# 返回 (ISO 日期 -> 菜单, 没能迁移的原始条目)；没能迁移的条目由调用方原样保留，不会丢
+	raw = load_json(path, "历史记录") or {}
+	dates, ambiguous, unknown = normalize_legacy_dates(raw)
+	if ambiguous:
+		print(f"历史记录里有 {len(ambiguous)} 个日期分不清是日/月还是月/日，暂不迁移、原样保留: "
+		      f"{'、'.join(ambiguous[:5])}")
+	if unknown:
+		print(f"历史记录里有 {len(unknown)} 个无法识别的日期，原样保留: {'、'.join(map(str, unknown[:5]))}")
+	menus = {date_iso: raw[key] for key, date_iso in dates.items()}
+	unresolved = {key: raw[key] for key in ambiguous + unknown}
+	return menus, unresolved
+
+
+class JsonHistoryBackend:
+	def __init__(self, path, writer=None):
+		# 文件损坏时会被挪到一边，读不了（权限等）就直接报错，不会拿空记录覆盖原文件
+		self.path = path
+		self.writer = writer or shared_writer()
+		self.lock = threading.Lock()
+		# 没能确定日期的旧条目也写回文件，免得整体重写时丢掉
+		self.menus, self.unresolved = load_legacy_history(self.path)
+		self.sorted_dates = sorted(self.menus)
+		# 标记和历史里引用过的菜品存在旁边的文件里，历史文件本身还是 日期 -> 菜单
+		self.meta_path = os.path.splitext(self.path)[0] + "_meta.json"
+		extra = load_json(self.meta_path, "历史记录附加信息") or {}
+		self.meta = extra.get("meta", {})
+		self.dishes = extra.get("dishes", {})
+
+	def get(self, date_iso):
+		return self.menus.get(date_iso)
+
+	def put_many(self, menus, dishes=None):
+		with self.lock:
+			self.menus.update(menus)
+			self.sorted_dates = sorted(self.menus)
+			if dishes:
+				self.dishes.update(dishes)
+		if dishes:
+			self.writer.schedule(self.meta_path, self.render_meta)
+		# 连续确认多天时只在最后整体写一次
+		self.writer.schedule(self.path, self.render)
+
+	def render(self):
+		with self.lock:
+			return dump_json({**self.unresolved, **self.menus})
+
+	def render_meta(self):
+		with self.lock:
+			return dump_json({"meta": self.meta, "dishes": self.dishes})
+
+	def range(self, start_iso, end_iso):
+		lo = bisect.bisect_left(self.sorted_dates, start_iso)
+		hi = bisect.bisect_right(self.sorted_dates, end_iso)
+		return [(date_iso, self.menus[date_iso]) for date_iso in self.sorted_dates[lo:hi]]
+
+	def dates(self):
+		return list(self.sorted_dates)
+
+	def get_dishes(self, keys):
+		return {key: self.dishes[key] for key in keys if key in self.dishes}
+
+	def get_meta(self, key):
+		return self.meta.get(key)
+
+	def set_meta(self, key, value):
+		with self.lock:
+			self.meta[key] = value
+		self.writer.schedule(self.meta_path, self.render_meta)
+
+	def close(self):
+		self.writer.flush([self.meta_path, self.path])
+
+
+class SqliteHistoryBackend:
+	def __init__(self, path, legacy_path=None):
+		self.path = path
+		os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+		self.connection = sqlite3.connect(self.path, check_same_thread=False)
+		with self.connection:
+			# date 是主键，按 ISO 日期排序和范围查询都走索引
+			self.connection.execute(
+				"CREATE TABLE IF NOT EXISTS history (date TEXT PRIMARY KEY, menu TEXT NOT NULL) WITHOUT ROWID")
+			self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+			# 历史里引用过的菜品，按内容指纹存一份；食谱之后改了或删了，老记录照样能还原
+			self.connection.execute("CREATE TABLE IF NOT EXISTS dishes (key TEXT PRIMARY KEY, dish TEXT NOT NULL) WITHOUT ROWID")
+		if legacy_path:
+			self.migrate_legacy(legacy_path)
+
+	def migrate_legacy(self, legacy_path):
+		if not os.path.exists(legacy_path) or self.get_meta('migrated_from') is not None:
+			return
+		try:
+			# 没能确定日期的条目留在旧文件里
+			menus, _ = load_legacy_history(legacy_path)
+		except Exception as e:
+			print(f"迁移历史记录失败: {e}")
+			return
+		with self.connection:
+			# 已经在新库里的日期以新库为准
+			self.connection.executemany(
+				"INSERT OR IGNORE INTO history (date, menu) VALUES (?, ?)",
+				[(date_iso, json.dumps(menu, ensure_ascii=False)) for date_iso, menu in menus.items()])
+			self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from', ?)",
+			                        (os.path.abspath(legacy_path),))
+
+	def get_meta(self, key):
+		row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+		return row[0] if row else None
+
+	def set_meta(self, key, value):
+		with self.connection:
+			self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+	def get(self, date_iso):
+		row = self.connection.execute("SELECT menu FROM history WHERE date = ?", (date_iso,)).fetchone()
+		return json.loads(row[0]) if row else None
+
+	def put_many(self, menus, dishes=None):
+		with self.connection:
+			if dishes:
+				self.connection.executemany(
+					"INSERT OR IGNORE INTO dishes (key, dish) VALUES (?, ?)",
+					[(key, json.dumps(dish, ensure_ascii=False)) for key, dish in dishes.items()])
+			self.connection.executemany(
+				"INSERT OR REPLACE INTO history (date, menu) VALUES (?, ?)",
+				[(date_iso, json.dumps(menu, ensure_ascii=False)) for date_iso, menu in menus.items()])
+
+	def get_dishes(self, keys):
+		keys = list(keys)
+		rows = self.connection.execute(
+			f"SELECT key, dish FROM dishes WHERE key IN ({', '.join('?' * len(keys))})", keys) if keys else []
+		return {key: json.loads(dish) for key, dish in rows}
+
+	def range(self, start_iso, end_iso):
+		rows = self.connection.execute(
+			"SELECT date, menu FROM history WHERE date BETWEEN ? AND ? ORDER BY date", (start_iso, end_iso))
+		return [(date_iso, json.loads(menu)) for date_iso, menu in rows]
+
+	def dates(self):
+		return [row[0] for row in self.connection.execute("SELECT date FROM history ORDER BY date")]
+
+	def close(self):
+		self.connection.close()
+
+
+def open_history_backend(kind, path, legacy_path=None):
+	if kind == "json":
+		return JsonHistoryBackend(legacy_path or path)
+	if kind == "sqlite":
+		return SqliteHistoryBackend(path, legacy_path)
+	raise ValueError(f"未知的历史记录存储方式: {kind}")
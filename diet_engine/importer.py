@@ -0,0 +1,203 @@
+import csv
+import hashlib
+import json
+import math
+import os
+
+import numpy as np
+
+DIFFICULTIES = ("易", "中", "难")
+
+
+def check_header(header, columns):
+	missing = [col for col in columns if col not in header]
+	if missing:
+		raise ValueError(f"食谱缺少这些列: {missing}")
+
+
+def iter_xlsx_rows(path, columns):
+	from openpyxl import load_workbook
+
+	# 只读模式按行读取，不会把整张表放进内存
+	workbook = load_workbook(path, read_only=True, data_only=True)
+	try:
+		rows = workbook.worksheets[0].iter_rows(values_only=True)
+		header = [str(cell).strip() if cell is not None else '' for cell in next(rows, ())]
+		check_header(header, columns)
+		for line, values in enumerate(rows, start=2):
+			if all(value is None or value == '' for value in values):
+				continue
+			yield line, dict(zip(header, values))
+	finally:
+		workbook.close()
+
+
+def iter_xls_rows(path, columns):
+	# 旧版 Excel（.xls）要用 xlrd 读
+	try:
+		import xlrd
+	except ImportError:
+		raise ValueError(f"读取 .xls 文件需要先安装 xlrd（pip install xlrd），或者把 {os.path.basename(path)} 另存为 .xlsx")
+
+	workbook = xlrd.open_workbook(path, on_demand=True)
+	try:
+		sheet = workbook.sheet_by_index(0)
+		header = [str(cell).strip() for cell in sheet.row_values(0)] if sheet.nrows else []
+		check_header(header, columns)
+		for index in range(1, sheet.nrows):
+			values = sheet.row_values(index)
+			if all(value == '' for value in values):
+				continue
+			yield index + 1, dict(zip(header, values))
+	finally:
+		workbook.release_resources()
+
+
+def iter_csv_rows(path, columns):
+	with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+		reader = csv.reader(f)
+		header = [cell.strip() for cell in next(reader, [])]
+		check_header(header, columns)
+		for values in reader:
+			if not any(values):
+				continue
+			yield reader.line_num, dict(zip(header, values))
+
+
+def iter_jsonl_rows(path, columns):
+	with open(path, 'r', encoding='utf-8-sig') as f:
+		for line, text in enumerate(f, start=1):
+			if not text.strip():
+				continue
+			try:
+				row = json.loads(text)
+			except ValueError:
+				row = None
+			yield line, row if isinstance(row, dict) else None
+
+
+READERS = {
+	'.xlsx': iter_xlsx_rows,
+	'.xlsm': iter_xlsx_rows,
+	'.xls': iter_xls_rows,
+	'.csv': iter_csv_rows,
+	'.jsonl': iter_jsonl_rows,
+}
+
+
+def parse_number(value, col):
+	if isinstance(value, str):
+		text = value.strip()
+		try:
+			value = int(text) if text else None
+		except ValueError:
+			try:
+				value = float(text)
+			except ValueError:
+				raise ValueError(f"{col} 不是数字: {text}")
+	if value is None:
+		raise ValueError(f"{col} 为空")
+	if isinstance(value, bool) or not isinstance(value, (int, float)) or math.isnan(value):
+		raise ValueError(f"{col} 不是数字: {value}")
+	return value
+
+
+def convert_row(row, columns, text_columns):
+	if row is None:
+		raise ValueError("不是合法的 JSON 对象")
+	values = []
+	for col in columns:
+		value = row.get(col)
+		if col in text_columns:
+			values.append('' if value is None else str(value))
+		else:
+			values.append(parse_number(value, col))
+	dish = dict(zip(columns, values))
+	if not dish['name'].strip():
+		raise ValueError("name 为空")
+	if dish['difficulty'] not in DIFFICULTIES:
+		raise ValueError(f"difficulty 只能是 {'/'.join(DIFFICULTIES)}: {dish['difficulty']}")
+	return values
+
+
+def row_fingerprint(row, columns):
+	# 原始单元格内容的指纹（跨进程稳定），热加载时指纹没变的行不用再解析
+	text = repr(tuple(row.get(col) for col in columns)) if row is not None else ''
+	return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def open_reader(path):
+	reader = READERS.get(os.path.splitext(path)[1].lower())
+	if reader is None:
+		raise ValueError(f"不支持的食谱格式: {os.path.basename(path)}（可用 {', '.join(READERS)}）")
+	return reader
+
+
+def read_catalogue(path, columns, text_columns, chunk_size=10000, max_errors=100):
+	# 逐行校验，每攒够 chunk_size 行就转成 numpy 列，内存只随有效数据增长；另附每行的指纹
+	reader = open_reader(path)
+	chunks = {col: [] for col in columns + ['fingerprint']}
+	pending = []
+	fingerprints = []
+	names = set()
+	errors = []
+	bad_rows = 0
+
+	def flush():
+		for col, values in zip(columns, zip(*pending)):
+			chunks[col].append(np.array(values, dtype=str) if col in text_columns else np.array(values))
+		chunks['fingerprint'].append(np.array(fingerprints, dtype=np.uint64))
+		pending.clear()
+		fingerprints.clear()
+
+	for line, row in reader(path, columns):
+		try:
+			values = convert_row(row, columns, text_columns)
+			if values[0] in names:
+				raise ValueError(f"菜名重复: {values[0]}")
+		except ValueError as e:
+			bad_rows += 1
+			if len(errors) < max_errors:
+				errors.append(f"第 {line} 行: {e}")
+			continue
+		names.add(values[0])
+		pending.append(values)
+		fingerprints.append(row_fingerprint(row, columns))
+		if len(pending) >= chunk_size:
+			flush()
+	if pending:
+		flush()
+	if not names:
+		raise ValueError("食谱里没有可用的菜" + (f"（{errors[0]}）" if errors else ""))
+	return {col: np.concatenate(parts) for col, parts in chunks.items()}, errors, bad_rows
+
+
+def read_changes(path, columns, text_columns, index, fingerprints, max_errors=100):
+	# 热加载用：index 是菜名 -> 下标，fingerprints 是各下标上一次的行指纹。
+	# 指纹相同的行直接跳过，只解析新增或改过的行；返回 (改动的行, 文件里仍有的菜名, 错误, 错误行数)。
+	# 改坏的行如果菜名还对得上，算作仍有这道菜、内容不变，不会因为一处笔误把菜连同学到的权重删掉
+	changed = []
+	present = set()
+	errors = []
+	bad_rows = 0
+	for line, row in open_reader(path)(path, columns):
+		fingerprint = row_fingerprint(row, columns)
+		name = str(row.get('name', '')) if row is not None else ''
+		i = index.get(name)
+		if i is not None and fingerprints[i] == fingerprint and name not in present:
+			present.add(name)
+			continue
+		try:
+			values = convert_row(row, columns, text_columns)
+			if values[0] in present:
+				raise ValueError(f"菜名重复: {values[0]}")
+		except ValueError as e:
+			bad_rows += 1
+			if len(errors) < max_errors:
+				errors.append(f"第 {line} 行: {e}")
+			if i is not None:
+				present.add(name)
+			continue
+		present.add(values[0])
+		changed.append((values, fingerprint))
+	return changed, present, errors, bad_rows
@@ -0,0 +1,164 @@
+import bisect
+import os
+import re
+import sqlite3
+
+from diet_engine.persist import dump_json, load_json, shared_writer
+
+CHINESE_NUMBERS = {"半": 0.5, "一": 1, "两": 2, "二": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9, "十": 10}
+# “西红柿2个”、“牛/猪肉 150g”、“红椒半个” 这类写法末尾的数量和单位
+# 数字前面不能紧挨着数字或小数点，“蒜.”、“1.5.2” 这类写法整体当作食材名
+QUANTITY_PATTERN = re.compile(r'\s*(?<![\d.])(\d+(?:\.\d+)?|[半一两二三四五六七八九十])\s*(g|kg|克|千克|ml|毫升|个|根|块|片|勺|颗|只|把|瓣|份|包|盒|袋|条|斤)?\s*$')
+
+
+def split_ingredients(ingredient_str):
+	return [ing.strip() for ing in str(ingredient_str).replace('，', ',').split(',') if ing.strip() not in ('', '-')]
+
+
+def parse_ingredient(token):
+	match = QUANTITY_PATTERN.search(token)
+	if not match or match.start() == 0:
+		return token, None, ''
+	number = match.group(1)
+	try:
+		amount = CHINESE_NUMBERS[number] if number in CHINESE_NUMBERS else float(number)
+	except ValueError:
+		return token, None, ''
+	return token[:match.start()].strip(), amount, match.group(2) or ''
+
+
+class IngredientIndex:
+	def __init__(self, dishes):
+		self.token_ids = {}
+		self.tokens = []
+		self.names = []
+		self.name_dishes = {}
+		self.dish_main = []
+		self.dish_side = []
+		for i, dish in enumerate(dishes):
+			self.dish_main.append(self.add_dish_tokens(i, dish['main_ingredients']))
+			self.dish_side.append(self.add_dish_tokens(i, dish['side_ingredients']))
+
+	def __len__(self):
+		return len(self.tokens)
+
+	def intern(self, token):
+		token_id = self.token_ids.get(token)
+		if token_id is None:
+			token_id = self.token_ids[token] = len(self.tokens)
+			self.tokens.append(token)
+			self.names.append(parse_ingredient(token)[0])
+		return token_id
+
+	def add_dish_tokens(self, dish_id, ingredient_str):
+		token_ids = [self.intern(token) for token in split_ingredients(ingredient_str)]
+		for token_id in token_ids:
+			# “鸡腿/鸡胸肉” 同时登记在 “鸡腿” 和 “鸡胸肉” 下
+			name = self.names[token_id]
+			for key in {name, *name.split('/')}:
+				dishes = self.name_dishes.setdefault(key, [])
+				if not dishes or dishes[-1] < dish_id:
+					dishes.append(dish_id)
+				else:
+					# 热加载时改过的菜按编号插回原位，列表保持有序
+					k = bisect.bisect_left(dishes, dish_id)
+					if k == len(dishes) or dishes[k] != dish_id:
+						dishes.insert(k, dish_id)
+		return token_ids
+
+	def add_dish(self, dish_id, dish):
+		if dish_id == len(self.dish_main):
+			self.dish_main.append([])
+			self.dish_side.append([])
+		self.dish_main[dish_id] = self.add_dish_tokens(dish_id, dish['main_ingredients'])
+		self.dish_side[dish_id] = self.add_dish_tokens(dish_id, dish['side_ingredients'])
+
+	def remove_dish(self, dish_id):
+		for token_id in self.dish_main[dish_id] + self.dish_side[dish_id]:
+			name = self.names[token_id]
+			for key in {name, *name.split('/')}:
+				dishes = self.name_dishes.get(key)
+				if dishes:
+					k = bisect.bisect_left(dishes, dish_id)
+					if k < len(dishes) and dishes[k] == dish_id:
+						del dishes[k]
+		self.dish_main[dish_id] = []
+		self.dish_side[dish_id] = []
+
+	def main_tokens(self, dish_id):
+		return [self.tokens[token_id] for token_id in self.dish_main[dish_id]]
+
+	def dishes_using(self, name):
+		# 精确匹配食材名；没有的话再按包含关系找，比如“鸡蛋”也能找到“鸡蛋2个”所在的菜
+		name = parse_ingredient(name.strip())[0]
+		if name in self.name_dishes:
+			return list(self.name_dishes[name])
+		found = set()
+		for ingredient_name, dishes in self.name_dishes.items():
+			if name and name in ingredient_name:
+				found.update(dishes)
+		return sorted(found)
+
+
+class JsonInventoryStore:
+	def __init__(self, path, writer=None):
+		self.path = path
+		self.writer = writer or shared_writer()
+
+	def load(self):
+		return load_json(self.path, "材料库") or {}
+
+	def save(self, inventory, changed):
+		# 调用方拿着锁，这里先序列化好，真正写文件交给后台合并
+		data = dump_json(inventory)
+		self.writer.schedule(self.path, lambda: data)
+
+	def close(self):
+		self.writer.flush([self.path])
+
+
+class SqliteInventoryStore:
+	def __init__(self, path, legacy_path=None):
+		os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+		self.connection = sqlite3.connect(path, check_same_thread=False)
+		with self.connection:
+			self.connection.execute(
+				"CREATE TABLE IF NOT EXISTS inventory "
+				"(ingredient TEXT PRIMARY KEY, count INTEGER NOT NULL, total_amount REAL NOT NULL) WITHOUT ROWID")
+			self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+		if legacy_path:
+			self.migrate_legacy(legacy_path)
+
+	def migrate_legacy(self, legacy_path):
+		row = self.connection.execute("SELECT value FROM meta WHERE key = 'inventory_migrated_from'").fetchone()
+		if row or not os.path.exists(legacy_path):
+			return
+		inventory = JsonInventoryStore(legacy_path).load()
+		with self.connection:
+			self.connection.executemany(
+				"INSERT OR IGNORE INTO inventory (ingredient, count, total_amount) VALUES (?, ?, ?)",
+				[(ing, data['count'], data['total_amount']) for ing, data in inventory.items()])
+			self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('inventory_migrated_from', ?)",
+			                        (os.path.abspath(legacy_path),))
+
+	def load(self):
+		rows = self.connection.execute("SELECT ingredient, count, total_amount FROM inventory")
+		return {ing: {'count': count, 'total_amount': total_amount} for ing, count, total_amount in rows}
+
+	def save(self, inventory, changed):
+		# 只写本次变动的食材
+		with self.connection:
+			self.connection.executemany(
+				"INSERT OR REPLACE INTO inventory (ingredient, count, total_amount) VALUES (?, ?, ?)",
+				[(ing, inventory[ing]['count'], inventory[ing]['total_amount']) for ing in changed])
+
+	def close(self):
+		self.connection.close()
+
+
+def open_inventory_store(kind, path, legacy_path=None):
+	if kind == "json":
+		return JsonInventoryStore(legacy_path or path)
+	if kind == "sqlite":
+		return SqliteInventoryStore(path, legacy_path)
+	raise ValueError(f"未知的材料库存储方式: {kind}")
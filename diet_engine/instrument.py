@@ -0,0 +1,105 @@
+import collections
+import contextlib
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+
+NULL_TIMER = contextlib.nullcontext()
+
+
+class StageTimer:
+	__slots__ = ("stats", "stage", "start")
+
+	def __init__(self, stats, stage):
+		self.stats = stats
+		self.stage = stage
+
+	def __enter__(self):
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, *exc):
+		self.stats.record(self.stage, time.perf_counter() - self.start)
+		return False
+
+
+class Stats:
+	def __init__(self, enabled=False):
+		# 关闭时 timer() 返回共享的空上下文，count() 直接返回，几乎没有开销
+		self.enabled = enabled
+		self.lock = threading.Lock()
+		self.timings = {}
+		self.counters = collections.Counter()
+		self.profiler = None
+
+	def timer(self, stage):
+		return StageTimer(self, stage) if self.enabled else NULL_TIMER
+
+	def record(self, stage, seconds):
+		with self.lock:
+			timing = self.timings.get(stage)
+			if timing is None:
+				self.timings[stage] = [1, seconds, seconds]
+			else:
+				timing[0] += 1
+				timing[1] += seconds
+				timing[2] = max(timing[2], seconds)
+
+	def count(self, name, n=1):
+		if self.enabled:
+			with self.lock:
+				self.counters[name] += n
+
+	def reset(self):
+		with self.lock:
+			self.timings.clear()
+			self.counters.clear()
+
+	def start_profile(self):
+		if self.profiler is None:
+			self.profiler = cProfile.Profile()
+			self.profiler.enable()
+
+	def stop_profile(self, path=None, limit=30):
+		if self.profiler is None:
+			return ""
+		self.profiler.disable()
+		profiler, self.profiler = self.profiler, None
+		if path:
+			profiler.dump_stats(path)
+		output = io.StringIO()
+		pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(limit)
+		return output.getvalue()
+
+	def snapshot(self):
+		with self.lock:
+			return {
+				"timings": {
+					stage: {"count": count, "total_ms": total * 1000, "mean_ms": total / count * 1000,
+					        "max_ms": longest * 1000}
+					for stage, (count, total, longest) in sorted(self.timings.items())
+				},
+				"counters": dict(sorted(self.counters.items())),
+			}
+
+	def dump(self, path):
+		text = json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+		if path == "-":
+			print(text)
+			return
+		with open(path, 'w', encoding='utf-8') as f:
+			f.write(text)
+
+	def report(self):
+		snapshot = self.snapshot()
+		lines = [f"{'阶段':<24}{'次数':>8}{'平均(ms)':>12}{'最长(ms)':>12}{'合计(ms)':>12}"]
+		for stage, timing in snapshot["timings"].items():
+			lines.append(f"{stage:<24}{timing['count']:>8}{timing['mean_ms']:>12.3f}"
+			             f"{timing['max_ms']:>12.3f}{timing['total_ms']:>12.1f}")
+		if snapshot["counters"]:
+			lines.append("")
+			lines.extend(f"{name}: {value}" for name, value in snapshot["counters"].items())
+		return "\n".join(lines)
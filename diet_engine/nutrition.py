@@ -0,0 +1,54 @@
+import heapq
+
+import numpy as np
+
+
+class MacroIndex:
+	leaf_size = 16
+
+	def __init__(self, points):
+		self.points = np.asarray(points, dtype=float).reshape(-1, 3)
+		self.nodes = []
+		self.root = self._build(np.arange(len(self.points)))
+
+	def _build(self, ids):
+		if len(ids) <= self.leaf_size:
+			self.nodes.append((-1, 0.0, ids, None))
+			return len(self.nodes) - 1
+		points = self.points[ids]
+		axis = int(np.argmax(points.max(axis=0) - points.min(axis=0)))
+		order = np.argsort(points[:, axis], kind='stable')
+		middle = len(ids) // 2
+		node = len(self.nodes)
+		self.nodes.append(None)
+		left = self._build(ids[order[:middle]])
+		right = self._build(ids[order[middle:]])
+		self.nodes[node] = (axis, float(points[order[middle], axis]), left, right)
+		return node
+
+	def nearest(self, target, k, exclude=()):
+		# 按 (蛋白质, 脂肪, 碳水) 欧氏距离找最近的 k 道菜，最近的排在前面
+		# exclude 只需要支持 in，可以是集合或者 weights.Exclusion
+		target = np.asarray(target, dtype=float)
+		best = []
+		pending = [(0.0, self.root)]
+		while pending:
+			bound, node = heapq.heappop(pending)
+			if len(best) == k and bound >= -best[0][0]:
+				break
+			axis, split, left, right = self.nodes[node]
+			if axis < 0:
+				distances = ((self.points[left] - target) ** 2).sum(axis=1)
+				for i, distance in zip(left.tolist(), distances.tolist()):
+					if i in exclude:
+						continue
+					if len(best) < k:
+						heapq.heappush(best, (-distance, i))
+					elif distance < -best[0][0]:
+						heapq.heapreplace(best, (-distance, i))
+				continue
+			diff = target[axis] - split
+			near, far = (left, right) if diff < 0 else (right, left)
+			heapq.heappush(pending, (bound, near))
+			heapq.heappush(pending, (max(bound, diff * diff), far))
+		return [i for _, i in sorted(best, reverse=True)]
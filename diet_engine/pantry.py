@@ -0,0 +1,96 @@
+import numpy as np
+
+from diet_engine.ingredients import parse_ingredient, split_ingredients
+from diet_engine.persist import dump_json, load_json, shared_writer
+
+# 换算到同一单位后才能扣减库存
+UNIT_ALIASES = {"克": ("g", 1), "千克": ("g", 1000), "kg": ("g", 1000), "毫升": ("ml", 1), "斤": ("g", 500)}
+
+
+def normalize_amount(amount, unit):
+	unit, factor = UNIT_ALIASES.get(unit, (unit, 1))
+	return amount * factor, unit
+
+
+def parse_pantry_line(line):
+	# “鸡蛋 6个”、“牛肉500g”、“酱油”（只说有，不计量）
+	name, amount, unit = parse_ingredient(line.strip())
+	return name, {"amount": amount, "unit": unit}
+
+
+def format_pantry_item(name, item):
+	if item["amount"] is None:
+		return name
+	return f"{name} {item['amount']:g}{item['unit']}"
+
+
+def load_pantry(path):
+	return load_json(path, "库存") or {}
+
+
+def save_pantry(path, pantry):
+	data = dump_json(pantry)
+	shared_writer().schedule(path, lambda: data)
+
+
+def on_hand(item):
+	return item["amount"] is None or item["amount"] > 0
+
+
+def use_ingredients(pantry, tokens):
+	# 按菜里写的用量扣库存，单位对不上时按 1 份扣不计量单位的库存；用完的食材从库存里删掉
+	changed = set()
+	for token in tokens:
+		name, amount, unit = parse_ingredient(token)
+		# “鸡腿/鸡胸肉” 扣掉第一种有货的
+		name = next((part for part in (name, *name.split('/')) if part in pantry and on_hand(pantry[part])), None)
+		if name is None or pantry[name]["amount"] is None:
+			continue
+		item = pantry[name]
+		used, used_unit = normalize_amount(1.0 if amount is None else amount, unit)
+		stock, stock_unit = normalize_amount(item["amount"], item["unit"])
+		if used_unit == stock_unit:
+			item["amount"] = (stock - used) / normalize_amount(1, item["unit"])[0]
+		elif not item["unit"]:
+			item["amount"] -= 1
+		else:
+			continue
+		if item["amount"] <= 1e-9:
+			del pantry[name]
+		changed.add(name)
+	return changed
+
+
+class PantryIndex:
+	def __init__(self, ingredient_index):
+		# 每道菜的主料（去掉用量）记成一个位集，每种写法一位，不折叠，子集判断才是精确的
+		index = ingredient_index
+		self.bit_ids = {}
+		rows, bits = [], []
+		for i, token_ids in enumerate(index.dish_main):
+			for name in {index.names[token_id] for token_id in token_ids}:
+				rows.append(i)
+				bits.append(self.bit_ids.setdefault(name, len(self.bit_ids)))
+		self.width = max(1, -(-len(self.bit_ids) // 64))
+		bits = np.asarray(bits, dtype=np.int64)
+		self.masks = np.zeros((len(index.dish_main), self.width), dtype=np.uint64)
+		np.bitwise_or.at(self.masks, (np.asarray(rows, dtype=np.int64), bits >> 6),
+		                 np.left_shift(np.uint64(1), (bits & 63).astype(np.uint64)))
+
+	def pantry_mask(self, pantry):
+		# “鸡腿/鸡胸肉” 这一位只要有其中一种就算有
+		available = {name for name, item in pantry.items() if on_hand(item)}
+		mask = np.zeros(self.width, dtype=np.uint64)
+		for name, bit in self.bit_ids.items():
+			if name in available or any(part in available for part in name.split('/')):
+				mask[bit >> 6] |= np.uint64(1) << np.uint64(bit & 63)
+		return mask
+
+	def cookable(self, pantry):
+		# 主料位集是库存位集的子集：masks & ~pantry == 0
+		missing = self.masks & ~self.pantry_mask(pantry)
+		return ~missing.any(axis=1)
+
+
+def dish_tokens(dish):
+	return split_ingredients(dish['main_ingredients']) + split_ingredients(dish['side_ingredients'])
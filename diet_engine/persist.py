@@ -0,0 +1,161 @@
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+def fsync_directory(directory):
+	# 让 rename 本身也落盘；Windows 上打不开目录，跳过
+	try:
+		fd = os.open(directory or '.', os.O_RDONLY)
+	except OSError:
+		return
+	try:
+		os.fsync(fd)
+	except OSError:
+		pass
+	finally:
+		os.close(fd)
+
+
+def atomic_write(path, data):
+	# 先写同目录下的临时文件并 fsync，再原子替换；中途崩溃时原文件不受影响
+	directory = os.path.dirname(path)
+	os.makedirs(directory or '.', exist_ok=True)
+	# 临时文件名各不相同，同一个文件被两个实例同时保存时不会互相替换掉对方的临时文件
+	fd, temp_path = tempfile.mkstemp(dir=directory or '.', prefix=os.path.basename(path) + ".", suffix=".tmp")
+	try:
+		with os.fdopen(fd, 'wb') as f:
+			f.write(data.encode('utf-8') if isinstance(data, str) else data)
+			f.flush()
+			os.fsync(f.fileno())
+		os.replace(temp_path, path)
+	except BaseException:
+		if os.path.exists(temp_path):
+			os.remove(temp_path)
+		raise
+	fsync_directory(directory)
+
+
+def move_aside(path):
+	aside = f"{path}.corrupt-{time.strftime('%Y%m%d-%H%M%S')}"
+	os.replace(path, aside)
+	return aside
+
+
+def load_json(path, label):
+	# 文件不存在返回 None；内容损坏时挪到一边留着（不会被下次保存覆盖），也返回 None
+	if not os.path.exists(path):
+		return None
+	try:
+		with open(path, 'r', encoding='utf-8') as f:
+			return json.load(f)
+	except ValueError as e:
+		aside = move_aside(path)
+		print(f"{label}文件已损坏，原文件已另存为 {aside}: {e}")
+		return None
+
+
+def dump_json(value):
+	return json.dumps(value, ensure_ascii=False, indent=2)
+
+
+class WriteBehind:
+	# 合并写：文件标记为脏之后，连续 delay 秒没有新改动、或者最早一次改动已过 max_delay 秒时由后台线程写出；
+	# 同一个文件多次改动只写最后的状态。render 在写的时候才调用，返回要写的 str / bytes
+	def __init__(self, delay=0.5, max_delay=5.0):
+		self.delay = delay
+		self.max_delay = max_delay
+		self.condition = threading.Condition()
+		# 同一时刻只有一个线程在写，保证后渲染的内容不会被先渲染的覆盖
+		self.write_lock = threading.Lock()
+		self.pending = {}
+		self.first_dirty = None
+		self.last_dirty = None
+		self.thread = None
+		self.closed = False
+		self.writes = 0
+		self.coalesced = 0
+
+	def schedule(self, path, render):
+		with self.condition:
+			if self.closed:
+				raise RuntimeError("写入线程已关闭")
+			if path in self.pending:
+				self.coalesced += 1
+			self.pending[path] = render
+			now = time.monotonic()
+			self.last_dirty = now
+			if self.first_dirty is None:
+				self.first_dirty = now
+			if self.thread is None:
+				self.thread = threading.Thread(target=self.run, name="write-behind", daemon=True)
+				self.thread.start()
+			self.condition.notify()
+
+	def due(self):
+		if not self.pending:
+			return None
+		return min(self.last_dirty + self.delay, self.first_dirty + self.max_delay)
+
+	def run(self):
+		while True:
+			with self.condition:
+				while not self.closed:
+					deadline = self.due()
+					if deadline is not None and time.monotonic() >= deadline:
+						break
+					self.condition.wait(None if deadline is None else deadline - time.monotonic())
+				if self.closed:
+					return
+			self.flush()
+
+	def flush(self, paths=None):
+		# paths 为空时写出全部；调用方不能拿着 render 里要用的锁，否则可能和后台线程互相等待
+		with self.write_lock:
+			with self.condition:
+				if paths is None:
+					batch, self.pending = self.pending, {}
+				else:
+					batch = {path: self.pending.pop(path) for path in paths if path in self.pending}
+				if not self.pending:
+					self.first_dirty = self.last_dirty = None
+			failed = {}
+			for path, render in batch.items():
+				try:
+					atomic_write(path, render())
+					self.writes += 1
+				except Exception as e:
+					print(f"写入 {path} 失败: {e}")
+					failed[path] = render
+			if failed:
+				with self.condition:
+					# 过一会儿再试，期间又有新改动的以新的为准
+					for path, render in failed.items():
+						self.pending.setdefault(path, render)
+					self.first_dirty = self.last_dirty = time.monotonic()
+		return not failed
+
+	def close(self):
+		with self.condition:
+			self.closed = True
+			self.condition.notify()
+		if self.thread is not None:
+			self.thread.join()
+		self.flush()
+
+
+shared = None
+shared_lock = threading.Lock()
+
+
+def shared_writer():
+	# 整个进程共用一个写入线程，退出时把没写完的写掉
+	global shared
+	with shared_lock:
+		if shared is None:
+			shared = WriteBehind()
+			atexit.register(shared.close)
+		return shared
@@ -0,0 +1,76 @@
+import numpy as np
+
+NUTRIENTS = ("protein", "fat", "carb")
+
+
+def nutrition_error(totals, target):
+	# 三大营养素相对目标的偏差平方和，target 为 0 的项不计
+	target = np.asarray(target, dtype=float)
+	scale = np.where(target > 0, target, 1.0)
+	error = ((totals - target) / scale) ** 2
+	return np.where(target > 0, error, 0.0).sum(axis=1)
+
+
+def score_nutrition(totals, weights, target):
+	return -nutrition_error(totals, target)
+
+
+def score_weighted(totals, weights, target):
+	# 营养偏差为主，权重（偏好、最近吃没吃过）只用来在差不多的组合里分高下
+	return -nutrition_error(totals, target) + 0.05 * np.log(np.maximum(weights, 1e-12)).sum(axis=1)
+
+
+SCORERS = {
+	"nutrition": score_nutrition,
+	"weighted": score_weighted,
+}
+
+
+def weighted_choice(rng, weights, mask, size):
+	p = np.where(mask, weights, 0.0)
+	total = p.sum()
+	if total <= 0:
+		# 候选的权重都是 0 时退回均匀抽取
+		p = mask.astype(float)
+		total = p.sum()
+	return rng.choice(len(p), size=size, p=p / total)
+
+
+def draw_pairs(rng, weights, lunch_mask, keys, dinner_masks, count):
+	# 先一次抽 count 道午餐，再按午餐所在分组（主蛋白、难度相同则排除条件相同）成批抽晚餐
+	lunches = weighted_choice(rng, weights, lunch_mask, count)
+	dinners = np.empty(count, dtype=np.int64)
+	lunch_keys = keys[lunches]
+	for key in np.unique(lunch_keys):
+		rows = np.nonzero(lunch_keys == key)[0]
+		dinners[rows] = weighted_choice(rng, weights, dinner_masks[key], len(rows))
+	keep = dinners != lunches
+	return lunches[keep], dinners[keep]
+
+
+def score_pairs(lunches, dinners, weights, nutrients, target, scorer):
+	totals = nutrients[lunches] + nutrients[dinners]
+	return scorer(totals, np.column_stack([weights[lunches], weights[dinners]]), target)
+
+
+def search_chunk(seed, count, weights, lunch_mask, keys, dinner_masks, nutrients, target, scorer):
+	# 进程池里跑的一块；scorer 要能被 pickle（模块级函数或 SCORERS 里的名字）
+	if isinstance(scorer, str):
+		scorer = SCORERS[scorer]
+	lunches, dinners = draw_pairs(np.random.default_rng(seed), weights, lunch_mask, keys, dinner_masks, count)
+	return lunches, dinners, score_pairs(lunches, dinners, weights, nutrients, target, scorer)
+
+
+def rank_pairs(lunches, dinners, scores, top):
+	# 相同的组合只保留一次，按得分从高到低取前 top 个
+	order = np.argsort(-scores, kind='stable')
+	ranked, seen = [], set()
+	for i in order.tolist():
+		pair = (int(lunches[i]), int(dinners[i]))
+		if pair in seen:
+			continue
+		seen.add(pair)
+		ranked.append((pair, float(scores[i])))
+		if len(ranked) >= top:
+			break
+	return ranked
@@ -0,0 +1,840 @@
+import concurrent.futures
+import datetime
+import functools
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+
+import numpy as np
+
+from diet_engine.analytics import NutritionTimeline
+from diet_engine.catalogue import CatalogueCache, Dish, dish_to_dict, missing_dish
+from diet_engine.importer import read_changes
+from diet_engine.history import normalize_date, open_history_backend
+from diet_engine.ingredients import IngredientIndex, open_inventory_store, split_ingredients
+from diet_engine.instrument import Stats
+from diet_engine.nutrition import MacroIndex
+from diet_engine.pantry import PantryIndex, dish_tokens, load_pantry, save_pantry, use_ingredients
+from diet_engine.persist import shared_writer
+from diet_engine.search import NUTRIENTS, rank_pairs, search_chunk
+from diet_engine.shopping import ShoppingMatrix, build_shopping_list
+from diet_engine.similarity import IngredientSignatures
+from diet_engine.weight_log import WeightJournal
+from diet_engine.weights import WeightStore
+
+
+def synchronized(method):
+	@functools.wraps(method)
+	def wrapper(self, *args, **kwargs):
+		with self.lock:
+			return method(self, *args, **kwargs)
+	return wrapper
+
+
+class DishSelector:
+	# 搜索模式下候选数至少是这个数的两倍时才拆给进程池，小批量在本进程里算反而更快
+	search_chunk_size = 8192
+
+	def __init__(self, excel_file, recent_days=3, penalty=0.3, long_term_reward=1.01,
+	             nutrition_mode="heuristic", match_candidates=8, history_backend="sqlite", data_dir="data",
+	             stats=None, exclusion_rules=None, search_candidates=256, search_top=5, search_scorer="weighted",
+	             search_workers=1, diversity_days=7, diversity_penalty=0.5, pantry_mode="off", pantry_penalty=0.1):
+		# 所有状态都在实例上；同一个实例可能被多个线程（服务、界面后台任务）同时使用
+		self.lock = threading.RLock()
+		self.stats = stats or Stats()
+		self.data_dir = data_dir
+		self.excel_file = excel_file
+		with self.stats.timer("load"):
+			self.dishes = self.load_dishes_from_excel(excel_file)
+		self.recent_dishes = []
+		self.recent_days = recent_days
+		self.penalty = penalty
+		self.long_term_reward = long_term_reward
+		self.difficulty_mapping = {"易": 1, "中": 0.9, "难": 0.8}
+		self.daily_nutrition_target = {}
+		# "heuristic": 按营养缺口给所有菜加权；"match": 晚餐从最接近缺口的若干道菜里按权重抽；
+		# "search": 一次抽 search_candidates 组午餐 + 晚餐，按 search_scorer 打分后给出前 search_top 组
+		self.nutrition_mode = nutrition_mode
+		self.match_candidates = match_candidates
+		# 和前 diversity_days 天吃过的菜食材重合越多，抽中的概率越低，完全相同时乘以 1 - diversity_penalty
+		self.diversity_days = diversity_days
+		self.diversity_penalty = diversity_penalty
+		# "prefer": 主料不全在库存里的菜抽中概率乘以 pantry_penalty；"only": 只从主料齐全的菜里选，一道都没有时退回 "prefer"
+		self.pantry_mode = pantry_mode
+		self.pantry_penalty = pantry_penalty
+		self.search_candidates = search_candidates
+		self.search_top = search_top
+		self.search_scorer = search_scorer
+		self.search_workers = search_workers
+		self.search_pool = None
+		self.macro_index = None
+		self.nutrient_matrix = None
+		self.initialize_dish_weights()
+		self.exclusion_rules = self.load_exclusion_rules(exclusion_rules)
+		self.weight_ops = []
+		self.weight_journal = WeightJournal(self.get_weight_snapshot_path(excel_file),
+		                                    self.get_weight_log_path(excel_file))
+		self.restore_weights()
+		self.history_file = self.get_history_file_path(excel_file)
+		self.history = open_history_backend(history_backend, self.get_history_db_path(excel_file), self.history_file)
+		# 每道菜的内容指纹（用到时才算），和历史里已经存过的菜品
+		self.dish_keys = None
+		self.archived_dishes = {}
+		self.compact_history()
+		self.timeline = None
+		self.previous_selected_dishes = []
+		# "search" 模式最近一次给出、还没选定的几组候选
+		self.pending_candidates = None
+		self.ingredient_index = IngredientIndex(self.dishes)
+		self.ingredient_signatures = None
+		self.shopping_matrix = None
+		self.inventory_file = self.get_inventory_file_path(excel_file)
+		self.inventory_store = open_inventory_store(history_backend, self.get_history_db_path(excel_file),
+		                                            self.inventory_file)
+		self.ingredient_inventory = self.inventory_store.load()
+		self.pantry_file = self.get_pantry_file_path(excel_file)
+		self.pantry = load_pantry(self.pantry_file)
+		self.pantry_index = None
+		self.cookable = None
+		# 上一次算出的抽样折扣，输入没变就直接复用同一个数组，抽样树也不用动
+		self.discount_cache = {}
+
+	def get_history_file_path(self, excel_path):
+		base_name = os.path.splitext(os.path.basename(excel_path))[0]
+		return os.path.join(self.data_dir, f"{base_name}_history.txt")
+
+	def get_history_db_path(self, excel_path):
+		base_name = os.path.splitext(os.path.basename(excel_path))[0]
+		return os.path.join(self.data_dir, f"{base_name}_history.db")
+
+	def get_weight_snapshot_path(self, excel_path):
+		base_name = os.path.splitext(os.path.basename(excel_path))[0]
+		return os.path.join(self.data_dir, f"{base_name}_weights.npz")
+
+	def get_weight_log_path(self, excel_path):
+		base_name = os.path.splitext(os.path.basename(excel_path))[0]
+		return os.path.join(self.data_dir, f"{base_name}_weights.log")
+
+	def get_inventory_file_path(self, excel_path):
+		base_name = os.path.splitext(os.path.basename(excel_path))[0]
+		return os.path.join(self.data_dir, f"{base_name}_inventory.json")
+
+	def get_pantry_file_path(self, excel_path):
+		base_name = os.path.splitext(os.path.basename(excel_path))[0]
+		return os.path.join(self.data_dir, f"{base_name}_pantry.json")
+
+	def get_rules_file_path(self, excel_path):
+		base_name = os.path.splitext(os.path.basename(excel_path))[0]
+		return os.path.join(self.data_dir, f"{base_name}_rules.json")
+
+	def load_exclusion_rules(self, rules):
+		# 例：{"column": "main_protein", "value": "鱼肉", "limit": 1, "days": 7} 七天内最多一次鱼；
+		# {"column": "main_protein", "only": ["无", "蛋类"], "weekdays": [0]} 周一只吃素
+		if rules is None:
+			path = self.get_rules_file_path(self.excel_file)
+			if not os.path.exists(path):
+				return []
+			try:
+				with open(path, 'r', encoding='utf-8') as f:
+					rules = json.load(f)
+			except (OSError, ValueError) as e:
+				print(f"读取排除规则失败: {e}")
+				return []
+		for rule in rules:
+			if rule.get("column") not in self.dish_weights.partition_columns:
+				raise ValueError(f"排除规则只能按这些列设置: {list(self.dish_weights.partition_columns)}")
+			if not ("limit" in rule and "value" in rule or "only" in rule or "exclude" in rule):
+				raise ValueError(f"无法识别的排除规则: {rule}")
+		return list(rules)
+
+	def rule_history(self, date, planned=None):
+		# 计数规则要看的前几天菜单
+		days = max((rule.get("days", 7) for rule in self.exclusion_rules if "limit" in rule), default=0)
+		if date is None or days <= 1:
+			return []
+		return self.menus_before(date, days - 1, planned)
+
+	def menus_before(self, date, days, planned=None):
+		# date 之前 days 天的菜单（包括还没写进历史的计划），返回 [(相隔天数, 菜)]
+		start = date - datetime.timedelta(days=days)
+		menus = dict(self.get_menus_between(start, date - datetime.timedelta(days=1)))
+		for date_iso, menu in (planned or {}).items():
+			if start.isoformat() <= date_iso < date.isoformat():
+				menus[date_iso] = menu
+		return [((date - datetime.date.fromisoformat(date_iso)).days, dish)
+		        for date_iso, menu in menus.items() for dish in menu]
+
+	def rule_groups(self, date, history, chosen=()):
+		# 当天按规则要排除的 (列, 取值) 分组
+		groups = []
+		if date is None:
+			return groups
+		for rule in self.exclusion_rules:
+			if "weekdays" in rule and date.weekday() not in rule["weekdays"]:
+				continue
+			col = rule["column"]
+			if "limit" in rule:
+				days = rule.get("days", 7)
+				count = sum(1 for ago, dish in history if ago < days and dish[col] == rule["value"])
+				count += sum(1 for dish in chosen if dish[col] == rule["value"])
+				if count >= rule["limit"]:
+					groups.append((col, rule["value"]))
+			elif "only" in rule:
+				groups.extend((col, value) for value in self.dish_weights.partitions[col] if value not in rule["only"])
+			else:
+				groups.extend((col, value) for value in rule["exclude"])
+		return groups
+
+	def dish_exclusion(self, dish, groups, same_name=True):
+		# 依次放宽：同名 + 同主蛋白 + 规则 -> 同名 + 规则 -> 只排除同名，免得把菜全排除掉
+		names = [dish["name"]] if dish is not None and same_name else []
+		protein = [("main_protein", dish["main_protein"])] if dish is not None else []
+		for extra in (protein + groups, groups, []):
+			exclusion = self.dish_weights.exclusion(names, extra)
+			if exclusion.count < len(self.dishes):
+				return exclusion
+		return exclusion
+
+	def dish_main_ingredients(self, dish):
+		dish_id = self.dish_weights.index.get(dish['name'])
+		if dish_id is not None and self.dishes[dish_id]['main_ingredients'] == dish['main_ingredients']:
+			return self.ingredient_index.main_tokens(dish_id)
+		# 历史里的菜已经不在当前食谱中
+		return split_ingredients(dish['main_ingredients'])
+
+	@synchronized
+	def update_ingredient_inventory(self, menu):
+		changed = set()
+		for dish in menu:
+			for ing in self.dish_main_ingredients(dish):
+				if ing in self.ingredient_inventory:
+					self.ingredient_inventory[ing]['count'] += 1
+					self.ingredient_inventory[ing]['total_amount'] += 1
+				else:
+					self.ingredient_inventory[ing] = {'count': 1, 'total_amount': 1}
+				changed.add(ing)
+		self.save_inventory(changed)
+
+	@synchronized
+	def set_pantry(self, pantry):
+		# pantry: {食材名: {"amount": 数量或 None（只说有）, "unit": 单位}}
+		self.pantry = pantry
+		self.cookable = None
+		self.save_pantry()
+
+	def save_pantry(self):
+		try:
+			save_pantry(self.pantry_file, self.pantry)
+		except Exception as e:
+			print(f"保存库存失败: {e}")
+
+	@synchronized
+	def cookable_mask(self):
+		# 主料都在库存里的菜；库存改了或食谱重新加载后才重新算
+		if self.cookable is None:
+			if self.pantry_index is None:
+				with self.stats.timer("pantry_index"):
+					self.pantry_index = PantryIndex(self.ingredient_index)
+			with self.stats.timer("pantry_filter"):
+				self.cookable = self.pantry_index.cookable(self.pantry) & self.dish_weights.live_mask
+		return self.cookable
+
+	def cookable_dishes(self):
+		return [self.dishes[i] for i in np.flatnonzero(self.cookable_mask())]
+
+	def pantry_discount(self):
+		if self.pantry_mode == "off":
+			return None
+		cookable = self.cookable_mask()
+		key = (self.pantry_mode, self.pantry_penalty)
+		cached = self.discount_cache.get("pantry")
+		if cached is None or cached[0] is not cookable or cached[1] != key:
+			penalty = self.pantry_penalty
+			if self.pantry_mode == "only":
+				if cookable.any():
+					penalty = 0.0
+				else:
+					print("库存里的食材凑不齐任何一道菜，按优先现有食材的方式选菜")
+			cached = self.discount_cache["pantry"] = (cookable, key, np.where(cookable, 1.0, penalty))
+		return cached[2]
+
+	def use_pantry(self, menu):
+		if not self.pantry:
+			return
+		changed = set()
+		for dish in menu:
+			changed |= use_ingredients(self.pantry, dish_tokens(dish))
+		if changed:
+			self.cookable = None
+			self.save_pantry()
+
+	def save_inventory(self, changed):
+		try:
+			with self.stats.timer("inventory_save"):
+				self.inventory_store.save(self.ingredient_inventory, changed)
+		except Exception as e:
+			print(f"保存材料库失败: {e}")
+
+	@synchronized
+	def shopping_list(self, start_date, end_date, menus=None):
+		# menus 为空时按历史记录（包括批量生成的计划）统计
+		if menus is None:
+			menus = [menu for _, menu in self.get_menus_between(start_date, end_date)]
+		if self.shopping_matrix is None:
+			self.shopping_matrix = ShoppingMatrix(self.ingredient_index)
+		return build_shopping_list(self.shopping_matrix, self.dish_weights.index, menus)
+
+	def dishes_by_name(self, names):
+		unknown = [name for name in names if name not in self.dish_weights.index]
+		if unknown:
+			raise ValueError(f"食谱中没有这些菜: {unknown}")
+		return [self.dishes[self.dish_weights.index[name]] for name in names]
+
+	@synchronized
+	def dishes_using(self, ingredient_name):
+		return [self.dishes[i] for i in self.ingredient_index.dishes_using(ingredient_name)]
+
+	def get_catalogue_cache_path(self, excel_path):
+		base_name = os.path.splitext(os.path.basename(excel_path))[0]
+		return os.path.join(self.data_dir, f"{base_name}_catalogue.npz")
+
+	def load_dishes_from_excel(self, excel_file):
+		cache = CatalogueCache(excel_file, self.get_catalogue_cache_path(excel_file))
+		stat = os.stat(excel_file)
+		self.catalogue_stat = (stat.st_mtime_ns, stat.st_size)
+		dishes, self.catalogue_version = cache.load()
+		self.stats.count(f"catalogue_{cache.status}")
+		self.import_errors, self.import_bad_rows = cache.errors, cache.bad_rows
+		self.row_fingerprints = cache.fingerprints.tolist()
+		if cache.bad_rows and cache.status == "compiled":
+			print(f"食谱中有 {cache.bad_rows} 行格式有误，已跳过:")
+			for error in cache.errors[:10]:
+				print(f"  {error}")
+		return dishes
+
+	def catalogue_changed(self):
+		try:
+			stat = os.stat(self.excel_file)
+		except OSError:
+			return False
+		return (stat.st_mtime_ns, stat.st_size) != self.catalogue_stat
+
+	@synchronized
+	def reload_if_changed(self):
+		return self.reload_catalogue() if self.catalogue_changed() else None
+
+	@synchronized
+	def reload_catalogue(self):
+		# 重新读食谱文件，行指纹没变的直接跳过，只解析改过的行，再按菜名给新增、删除、修改的菜打补丁；
+		# 学到的权重和最近吃过的菜都保留
+		with self.stats.timer("reload"):
+			stat = os.stat(self.excel_file)
+			store = self.dish_weights
+			live = store.index
+			rows, present, errors, bad_rows = read_changes(self.excel_file, CatalogueCache.columns,
+			                                               CatalogueCache.text_columns, live, self.row_fingerprints)
+			self.catalogue_stat = (stat.st_mtime_ns, stat.st_size)
+			if bad_rows:
+				print(f"食谱中有 {bad_rows} 行格式有误，已跳过（原来就有的菜保持不变）:")
+				for error in errors[:10]:
+					print(f"  {error}")
+			removed = [i for name, i in live.items() if name not in present]
+			added, changed = [], []
+			for values, fingerprint in rows:
+				dish = Dish(None, values)
+				i = live.get(dish.name)
+				if i is None:
+					added.append(dish)
+					self.row_fingerprints.append(fingerprint)
+					continue
+				self.row_fingerprints[i] = fingerprint
+				if self.dishes[i].values() != dish.values():
+					changed.append((i, dish))
+			if not (added or removed or changed):
+				return {"added": [], "removed": [], "changed": []}
+
+			removed_names = [self.dishes[i].name for i in removed]
+			for i in removed:
+				store.remove_dish(i)
+				self.ingredient_index.remove_dish(i)
+			for i, dish in changed:
+				dish.id = i
+				old_initial = self.initial_weights[i]
+				self.initial_weights[i] = self.calculate_initial_weight(dish)
+				# 偏好或难度改了，按初始权重的比例折算，和重启时恢复快照的做法一致
+				log_weight = self.rescaled_log_weight(store.log_weights[i] + store.offset, old_initial,
+				                                      self.initial_weights[i])
+				store.patch_dish(i, dish, log_weight)
+				old_dish, self.dishes[i] = self.dishes[i], dish
+				if (old_dish.main_ingredients, old_dish.side_ingredients) != (dish.main_ingredients, dish.side_ingredients):
+					self.ingredient_index.remove_dish(i)
+					self.ingredient_index.add_dish(i, dish)
+			if added:
+				initial = [self.calculate_initial_weight(dish) for dish in added]
+				for dish in added:
+					dish.id = len(self.dishes)
+					self.dishes.append(dish)
+					self.ingredient_index.add_dish(dish.id, dish)
+				self.initial_weights.extend(initial)
+				store.append_dishes(added, initial)
+			# 菜品编号和文件里的行号不再一一对应，换一个版本号，之后写的历史重启后按菜名找回
+			digest = CatalogueCache(self.excel_file, self.get_catalogue_cache_path(self.excel_file)).file_digest()
+			self.catalogue_version = f"{digest}+{os.urandom(4).hex()}"
+			self.macro_index = None
+			self.nutrient_matrix = None
+			self.shopping_matrix = None
+			self.ingredient_signatures = None
+			self.pantry_index = None
+			self.cookable = None
+			self.dish_keys = None
+			self.save_weight_snapshot()
+		self.stats.count("catalogue_reloads")
+		return {"added": [dish.name for dish in added], "removed": removed_names,
+		        "changed": [dish.name for _, dish in changed]}
+
+	def initialize_dish_weights(self):
+		# 权重向量按菜品在 self.dishes 中的下标存放，每个实例独立一份
+		self.initial_weights = [self.calculate_initial_weight(dish) for dish in self.dishes]
+		self.dish_weights = WeightStore(self.dishes, self.initial_weights)
+
+	def restore_weights(self):
+		snapshot = self.weight_journal.read_snapshot()
+		if snapshot is not None:
+			with self.stats.timer("weights_restore"):
+				self.reconcile_snapshot(snapshot)
+		events = self.weight_journal.read_events()
+		with self.stats.timer("weights_replay"):
+			for event in events:
+				for op in event['ops']:
+					self.apply_weight_op(op)
+		self.stats.count("weight_events_replayed", len(events))
+		self.weight_ops = []
+
+	def reconcile_snapshot(self, snapshot):
+		# 按菜名对齐：仍在食谱里的菜沿用学到的权重；偏好或难度改过的按初始权重的比例折算；新菜用初始权重
+		index = self.dish_weights.index
+		ids, log_weights = [], []
+		for name, log_weight, old_initial in zip(snapshot['names'], snapshot['log_weights'].tolist(),
+		                                         snapshot['initial_weights'].tolist()):
+			i = index.get(name)
+			if i is None:
+				continue
+			ids.append(i)
+			log_weights.append(self.rescaled_log_weight(log_weight, old_initial, self.initial_weights[i]))
+		if ids:
+			self.dish_weights.assign_log(ids, log_weights)
+		if snapshot['meta'].get('catalogue_version') != self.catalogue_version:
+			print(f"食谱已变更，已按菜名恢复 {len(ids)} 道菜的权重")
+		for name in snapshot['meta'].get('recent_dishes', []):
+			self.remember_recent(name)
+
+	@staticmethod
+	def rescaled_log_weight(log_weight, old_initial, new_initial):
+		# 偏好或难度改了，按初始权重的比例折算
+		if new_initial == old_initial:
+			return log_weight
+		if old_initial > 0 and new_initial > 0:
+			return log_weight + math.log(new_initial / old_initial)
+		return math.log(new_initial) if new_initial > 0 else -math.inf
+
+	def apply_weight_op(self, op):
+		kind = op[0]
+		if kind == "reward":
+			self.dish_weights.apply_penalty_and_reward(op[1], op[2])
+		elif kind == "nutrition":
+			self.dish_weights.apply_nutrition_gap(op[1])
+		elif kind == "scale":
+			if op[1] in self.dish_weights.index:
+				self.dish_weights.scale(op[1], op[2])
+		elif kind == "recent":
+			self.remember_recent(op[1])
+
+	def record_weight_event(self, event):
+		ops, self.weight_ops = self.weight_ops, []
+		try:
+			if self.weight_journal.append({"event": event, "ops": ops}):
+				self.save_weight_snapshot()
+		except OSError as e:
+			print(f"保存权重记录失败: {e}")
+
+	def save_weight_snapshot(self):
+		with self.stats.timer("weights_snapshot"):
+			meta = {"catalogue_version": self.catalogue_version, "recent_dishes": self.recent_dishes}
+			# 热加载删掉的菜不写进快照
+			live = self.dish_weights.live_mask
+			names = [name for name, keep in zip(self.dish_weights.names, live) if keep]
+			self.weight_journal.write_snapshot(names, self.dish_weights.absolute_log_weights[live],
+			                                   np.asarray(self.initial_weights)[live], meta)
+
+	def calculate_initial_weight(self, dish):
+		return dish["preference"] * self.difficulty_mapping[dish["difficulty"]]
+
+	def update_weights(self):
+		with self.stats.timer("update_weights"):
+			self.dish_weights.apply_penalty_and_reward(self.penalty, self.long_term_reward)
+		self.weight_ops.append(["reward", self.penalty, self.long_term_reward])
+
+	def remember_recent(self, name):
+		self.weight_ops.append(["recent", name])
+		self.recent_dishes.append(name)
+		self.dish_weights.mark_recent(name)
+		if len(self.recent_dishes) > self.recent_days:
+			self.dish_weights.mark_recent(self.recent_dishes.pop(0), -1)
+
+	def weighted_random_choice(self, exclusion=None):
+		with self.stats.timer("sampling"):
+			position = self.dish_weights.draw(exclusion)
+			if position is None:
+				position = random.choice([i for i in range(len(self.dishes)) if exclusion is None or i not in exclusion])
+		self.stats.count("draws")
+		return self.dishes[position]
+
+	def calculate_nutrition_gap(self, current_nutrition):
+		gap = {}
+		for nutrient in self.daily_nutrition_target:
+			gap[nutrient] = self.daily_nutrition_target[nutrient] - current_nutrition[nutrient]
+		return gap
+
+	def adjust_weights_for_nutrition(self, nutrition_gap):
+		with self.stats.timer("nutrition_adjust"):
+			self.dish_weights.apply_nutrition_gap(nutrition_gap)
+		self.weight_ops.append(["nutrition", nutrition_gap])
+
+	def nutrients_by_dish(self):
+		if self.nutrient_matrix is None:
+			self.nutrient_matrix = np.column_stack([self.dish_weights.nutrients[nutrient] for nutrient in NUTRIENTS])
+		return self.nutrient_matrix
+
+	def recent_meals(self, date, planned=None):
+		# 没有日期时退回到最近抽过的几道菜
+		if date is None:
+			return self.dishes_by_name(name for name in self.recent_dishes if name in self.dish_weights.index)
+		if self.diversity_days <= 0:
+			return []
+		return [dish for _, dish in self.menus_before(date, self.diversity_days, planned)]
+
+	def similarity_discount(self, dishes, slot):
+		# 按食材相似度给抽样打折，只影响这一次抽样，不写进权重记录；slot 区分最近几天的菜和刚抽的午餐
+		if self.diversity_penalty <= 0:
+			return None
+		index = self.dish_weights.index
+		dish_ids = frozenset(index[dish["name"]] for dish in dishes if dish["name"] in index)
+		if not dish_ids:
+			return None
+		if self.ingredient_signatures is None:
+			self.ingredient_signatures = IngredientSignatures(self.ingredient_index)
+		key = (dish_ids, self.diversity_penalty)
+		cached = self.discount_cache.get(slot)
+		if cached is None or cached[0] is not self.ingredient_signatures or cached[1] != key:
+			with self.stats.timer("diversity"):
+				factors = 1 - self.diversity_penalty * self.ingredient_signatures.similarity(dish_ids)
+			cached = self.discount_cache[slot] = (self.ingredient_signatures, key, factors)
+		return cached[2]
+
+	@staticmethod
+	def combine_discounts(*factors):
+		# 几种折扣相乘；只有一种时原样返回，WeightStore 能认出折扣没变
+		factors = [f for f in factors if f is not None]
+		return functools.reduce(np.multiply, factors) if factors else None
+
+	def closest_to_gap(self, nutrition_gap, exclude=()):
+		if self.macro_index is None:
+			self.macro_index = MacroIndex(self.nutrients_by_dish())
+		target = [max(nutrition_gap.get(nutrient, 0), 0) for nutrient in ("protein", "fat", "carb")]
+		# 小食谱里候选太多会稀释匹配效果，大约取总数的十分之一
+		k = max(2, min(self.match_candidates, len(self.dishes) // 10))
+		return self.macro_index.nearest(target, k, exclude)
+
+	def search_menus(self, lunch_excluded, date, history):
+		store = self.dish_weights
+		lunch_mask = ~lunch_excluded.mask()
+		# 午餐的 (主蛋白, 难度) 相同，晚餐的排除条件就相同，每种组合只算一次
+		keys = store.partition_keys
+		dinner_masks = {}
+		codes, first = np.unique(keys, return_index=True)
+		for key, dish_id in zip(codes.tolist(), first.tolist()):
+			lunch = self.dishes[dish_id]
+			dinner_masks[key] = ~self.dish_exclusion(lunch, self.rule_groups(date, history, [lunch]),
+			                                         same_name=False).mask()
+		target = np.array([self.daily_nutrition_target.get(nutrient, 0) for nutrient in NUTRIENTS], dtype=float)
+		args = (store.sampling_weights, lunch_mask, keys, dinner_masks, self.nutrients_by_dish(), target)
+		count = self.search_candidates
+		self.stats.count("search_candidates", count)
+		if self.search_workers > 1 and count >= 2 * self.search_chunk_size:
+			if self.search_pool is None:
+				self.search_pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.search_workers)
+			sizes = [count // self.search_workers + (i < count % self.search_workers) for i in range(self.search_workers)]
+			futures = [self.search_pool.submit(search_chunk, random.getrandbits(63), size, *args, self.search_scorer)
+			           for size in sizes]
+			results = [future.result() for future in futures]
+			lunches, dinners, scores = (np.concatenate(parts) for parts in zip(*results))
+		else:
+			lunches, dinners, scores = search_chunk(random.getrandbits(63), count, *args, self.search_scorer)
+		return [[self.dishes[lunch], self.dishes[dinner]]
+		        for (lunch, dinner), _ in rank_pairs(lunches, dinners, scores, self.search_top)]
+
+	def draw_daily_menu(self, lunch_excluded, date, history):
+		lunch = self.weighted_random_choice(lunch_excluded)
+		self.remember_recent(lunch["name"])
+		lunch_discount = self.similarity_discount([lunch], "lunch")
+		if lunch_discount is not None:
+			self.dish_weights.set_discount(self.combine_discounts(self.dish_weights.discount, lunch_discount))
+
+		current_nutrition = {
+			"protein": lunch["protein"],
+			"fat": lunch["fat"],
+			"carb": lunch["carb"]
+		}
+		nutrition_gap = self.calculate_nutrition_gap(current_nutrition)
+		if self.nutrition_mode != "match":
+			self.adjust_weights_for_nutrition(nutrition_gap)
+
+		dinner_excluded = self.dish_exclusion(lunch, self.rule_groups(date, history, [lunch]))
+
+		dinner = None
+		if self.nutrition_mode == "match":
+			if self.dish_weights.discount is not None:
+				# 按库存折扣到 0 的菜也不进最近邻候选
+				dinner_excluded.blocked = self.dish_weights.sampling_weights <= 0
+			with self.stats.timer("nutrition_match"):
+				candidates = self.closest_to_gap(nutrition_gap, dinner_excluded)
+			if candidates:
+				dinner = self.dishes[self.dish_weights.draw_among(candidates)]
+			dinner_excluded.blocked = None
+		if dinner is None:
+			dinner = self.weighted_random_choice(dinner_excluded)
+		self.remember_recent(dinner["name"])
+		return [lunch, dinner]
+
+	@synchronized
+	def generate_daily_menu(self, daily_nutrition_target, regenerate=False, previous_dinner=None, date=None,
+	                        planned=None):
+		menu = self.generate_menu_candidates(daily_nutrition_target, regenerate, previous_dinner, date, planned)[0]
+		self.select_menu(menu)
+		return menu
+
+	@synchronized
+	def generate_menu_candidates(self, daily_nutrition_target, regenerate=False, previous_dinner=None, date=None,
+	                             planned=None):
+		# 返回按推荐程度排好的若干组 [午餐, 晚餐]，只有 "search" 模式会给出多组，
+		# 这时选中的那组要等 select_menu 时才记为最近吃过、上调权重
+		# date 为空时不套用排除规则；planned 是同一批计划里前面几天还没存进历史的菜单
+		if date is not None:
+			date = datetime.date.fromisoformat(normalize_date(date))
+		self.daily_nutrition_target = daily_nutrition_target
+		self.stats.count("regenerate" if regenerate else "generate")
+		self.update_weights()
+
+		if regenerate:
+			for dish in self.previous_selected_dishes:
+				self.scale_weight(dish['name'], 0.7)
+
+		# 连续生成多天时，午餐也不和前一天晚餐同一种主蛋白
+		history = self.rule_history(date, planned)
+		self.dish_weights.set_discount(self.combine_discounts(
+			self.pantry_discount(), self.similarity_discount(self.recent_meals(date, planned), "recent")))
+		lunch_excluded = self.dish_exclusion(previous_dinner, self.rule_groups(date, history))
+		candidates = []
+		if self.nutrition_mode == "search":
+			with self.stats.timer("search"):
+				candidates = self.search_menus(lunch_excluded, date, history)
+		self.pending_candidates = candidates or None
+		if not candidates:
+			# 食谱太小、抽不出午晚不同的组合时也走普通抽取；抽的时候已经记过最近吃过
+			lunch, dinner = self.draw_daily_menu(lunch_excluded, date, history)
+			candidates = [[lunch, dinner]]
+			self.scale_weight(lunch['name'], 1.05)
+			self.scale_weight(dinner['name'], 1.05)
+
+		self.previous_selected_dishes = candidates[0]
+		self.record_weight_event("regenerate" if regenerate else "generate")
+		return candidates
+
+	@synchronized
+	def select_menu(self, menu):
+		# 用户从多组候选里选定一组；不是最近一次给出的候选（普通抽取、已经选过）时什么都不做
+		names = [dish['name'] for dish in menu]
+		if not self.pending_candidates or names not in ([dish['name'] for dish in pair] for pair in self.pending_candidates):
+			return
+		self.pending_candidates = None
+		self.previous_selected_dishes = menu
+		for name in names:
+			self.remember_recent(name)
+		for name in names:
+			self.scale_weight(name, 1.05)
+		self.record_weight_event("select")
+
+	def scale_weight(self, name, factor):
+		if name in self.dish_weights.index:
+			self.dish_weights.scale(name, factor)
+			self.weight_ops.append(["scale", name, factor])
+
+	@synchronized
+	def generate_plan(self, start_date, days, nutrition_target, commit=True):
+		previous_menu = self.get_menu_by_date(start_date - datetime.timedelta(days=1))
+		previous_dinner = previous_menu[1] if previous_menu else None
+
+		plan = {}
+		for offset in range(days):
+			date = start_date + datetime.timedelta(days=offset)
+			menu = self.generate_daily_menu(nutrition_target, previous_dinner=previous_dinner, date=date, planned=plan)
+			plan[date.isoformat()] = menu
+			previous_dinner = menu[1]
+
+		if commit:
+			self.add_menus_to_history(plan)
+		return plan
+
+	@staticmethod
+	def dish_key(dish):
+		# 菜品全部字段的指纹；整数和小数按同一个值算，旧记录里的 1 和食谱里的 1.0 是同一道菜
+		values = []
+		for col in CatalogueCache.columns:
+			value = dish.get(col)
+			if isinstance(value, int) and not isinstance(value, bool):
+				value = float(value)
+			values.append(value)
+		return hashlib.blake2b(repr(values).encode('utf-8'), digest_size=8).hexdigest()
+
+	def current_dish_keys(self):
+		if self.dish_keys is None:
+			self.dish_keys = [self.dish_key(dish) for dish in self.dishes]
+		return self.dish_keys
+
+	def menu_entry(self, menu):
+		# 历史里只存菜品编号、菜名和内容指纹，编号对应的食谱版本一并记下；
+		# 返回 (记录, 还没存过的菜品)
+		index = self.dish_weights.index
+		ids = [index.get(dish['name']) for dish in menu]
+		keys = None
+		if None not in ids:
+			keys = self.current_dish_keys()
+			keys = [keys[i] for i in ids]
+			# 菜名还在、但内容和现在食谱里的不一样（食谱改过之前生成的菜单、带别的字段的旧记录），不能按编号存
+			if any(dish is not self.dishes[i] and (self.dish_key(dish) != key or
+			                                       not isinstance(dish, Dish) and set(dish) != set(CatalogueCache.columns))
+			       for dish, i, key in zip(menu, ids, keys)):
+				keys = None
+		if keys is None:
+			# 当前食谱里没有这一版的菜，只能把所有字段都存下来
+			return [dish_to_dict(dish) if isinstance(dish, Dish) else dict(dish) for dish in menu], {}
+		dishes = {key: dish_to_dict(self.dishes[i]) for i, key in zip(ids, keys) if key not in self.archived_dishes}
+		return {"version": self.catalogue_version, "ids": ids, "names": [dish['name'] for dish in menu], "keys": keys}, dishes
+
+	def put_history(self, entries, dishes):
+		self.history.put_many(entries, dishes)
+		self.archived_dishes.update(dishes)
+
+	def archived_dish(self, key):
+		if key not in self.archived_dishes:
+			self.archived_dishes.update(self.history.get_dishes([key]))
+		return self.archived_dishes.get(key)
+
+	def resolve_menu(self, entry):
+		if entry is None or isinstance(entry, list):
+			# 旧格式：每道菜的字段都存在记录里
+			return entry
+		if entry.get("version") == self.catalogue_version:
+			return [self.dishes[dish_id] for dish_id in entry["ids"]]
+		# 食谱改过以后编号可能错位，按菜名找回；内容也改了或者菜已经删掉的，用记录时存下的那一版
+		index = self.dish_weights.index
+		keys = entry.get("keys") or [None] * len(entry["names"])
+		menu = []
+		for name, key in zip(entry["names"], keys):
+			i = index.get(name)
+			if i is not None and (key is None or self.current_dish_keys()[i] == key):
+				menu.append(self.dishes[i])
+			else:
+				menu.append((key and self.archived_dish(key)) or missing_dish(name))
+		return menu
+
+	def compact_history(self):
+		# 只转换内容和当前食谱完全一致的旧记录，其余的原样保留
+		if self.history.get_meta("compact_history") == "2":
+			return
+		dates = self.history.dates()
+		converted, dishes = {}, {}
+		if dates:
+			for date_iso, entry in self.history.range(dates[0], dates[-1]):
+				if isinstance(entry, list):
+					compact, new_dishes = self.menu_entry(entry)
+					if not isinstance(compact, list):
+						converted[date_iso] = compact
+						dishes.update(new_dishes)
+		try:
+			if converted:
+				self.put_history(converted, dishes)
+				print(f"已把 {len(converted)} 天的历史记录转换为紧凑格式")
+			self.history.set_meta("compact_history", "2")
+		except Exception as e:
+			print(f"转换历史记录失败: {e}")
+
+	def add_menu_to_history(self, date_str, menu):
+		self.add_menus_to_history({date_str: menu})
+
+	@synchronized
+	def add_menus_to_history(self, menus):
+		menus = {normalize_date(date): menu for date, menu in menus.items()}
+		self.stats.count("confirmed_days", len(menus))
+		try:
+			with self.stats.timer("history_save"):
+				entries, dishes = {}, {}
+				for date_iso, menu in menus.items():
+					entries[date_iso], new_dishes = self.menu_entry(menu)
+					dishes.update(new_dishes)
+				self.put_history(entries, dishes)
+		except Exception as e:
+			print(f"保存历史记录失败: {e}")
+		else:
+			if self.timeline is not None:
+				for date_iso, menu in sorted(menus.items()):
+					self.timeline.add(date_iso, menu)
+		self.update_ingredient_inventory([dish for menu in menus.values() for dish in menu])
+		self.use_pantry([dish for menu in menus.values() for dish in menu])
+
+	@synchronized
+	def nutrition_timeline(self):
+		# 第一次用到时按全部历史建立，之后每次确认增量更新
+		if self.timeline is None:
+			with self.stats.timer("timeline_build"):
+				dates = self.history.dates()
+				self.timeline = NutritionTimeline(self.get_menus_between(dates[0], dates[-1]) if dates else ())
+		return self.timeline
+
+	@synchronized
+	def nutrition_summary(self, date, top=5):
+		timeline = self.nutrition_timeline()
+		date = datetime.date.fromisoformat(normalize_date(date))
+		return {
+			"rolling_7": timeline.rolling_average(date, 7),
+			"rolling_30": timeline.rolling_average(date, 30),
+			"week": timeline.week_totals(date),
+			"month": timeline.month_totals(date),
+			"dishes": timeline.dish_frequency(top)
+		}
+
+	@synchronized
+	def get_menu_by_date(self, date):
+		return self.resolve_menu(self.history.get(normalize_date(date)))
+
+	@synchronized
+	def get_menus_between(self, start_date, end_date):
+		return [(date_iso, self.resolve_menu(entry))
+		        for date_iso, entry in self.history.range(normalize_date(start_date), normalize_date(end_date))]
+
+	@synchronized
+	def close(self):
+		try:
+			if self.weight_journal.pending_events:
+				self.save_weight_snapshot()
+		except OSError as e:
+			print(f"保存权重快照失败: {e}")
+		if self.search_pool is not None:
+			self.search_pool.shutdown()
+		self.weight_journal.close()
+		self.history.close()
+		self.inventory_store.close()
+		shared_writer().flush([self.pantry_file])
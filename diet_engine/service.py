@@ -0,0 +1,243 @@
+import collections
+import concurrent.futures
+import contextlib
+import datetime
+import json
+import os
+import re
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from diet_engine.catalogue import dish_to_dict
+from diet_engine.selector import DishSelector
+
+HOUSEHOLD_PATTERN = re.compile(r'^[\w\-]{1,64}$')
+
+
+class SelectorPool:
+	def __init__(self, catalogue_dir, data_root, capacity=16, reload_interval=1.0, **selector_options):
+		self.catalogue_dir = os.path.abspath(catalogue_dir)
+		self.data_root = data_root
+		self.capacity = capacity
+		# 每个实例最多每 reload_interval 秒看一次食谱文件；(上次检查的时间, 上次看到的修改时间和大小)
+		self.reload_interval = reload_interval
+		self.reload_checks = {}
+		self.selector_options = selector_options
+		self.selectors = collections.OrderedDict()
+		# 正在被请求使用的实例计数；被挤出缓存但还在用的实例等最后一个请求结束再关闭
+		self.checkouts = collections.Counter()
+		self.closing = {}
+		# 正在加载的实例：同一个用户同时来的请求只加载一次，其余的等它加载完
+		self.loading = {}
+		self.lock = threading.Lock()
+
+	def resolve_excel(self, excel):
+		path = os.path.abspath(os.path.join(self.catalogue_dir, excel))
+		if os.path.commonpath([path, self.catalogue_dir]) != self.catalogue_dir or not os.path.isfile(path):
+			raise ValueError(f"找不到食谱文件: {excel}")
+		return path
+
+	@contextlib.contextmanager
+	def checkout(self, excel, household):
+		selector = self.acquire(excel, household)
+		try:
+			yield selector
+		finally:
+			self.release(selector)
+
+	def acquire(self, excel, household):
+		if not HOUSEHOLD_PATTERN.match(household):
+			raise ValueError(f"无效的用户名: {household}")
+		key = (self.resolve_excel(excel), household)
+		loading = waiting = None
+		with self.lock:
+			selector = self.take(key)
+			if selector is None:
+				waiting = self.loading.get(key)
+				if waiting is None:
+					loading = self.loading[key] = concurrent.futures.Future()
+					loading.set_running_or_notify_cancel()
+			evicted = self.evict()
+		for old in evicted:
+			old.close()
+		if waiting is not None:
+			# 别的请求正在加载，等它加载完再从缓存里拿（加载失败时抛出同样的错误）
+			waiting.result()
+			return self.acquire(excel, household)
+		if selector is not None:
+			# 食谱文件改过就在原实例上增量更新，保留这个用户学到的权重
+			try:
+				if self.reload_due(key, selector):
+					selector.reload_if_changed()
+			except BaseException:
+				self.release(selector)
+				raise
+			return selector
+		# 加载放在锁外，避免一个大文件挡住其他用户
+		try:
+			selector = DishSelector(key[0], data_dir=os.path.join(self.data_root, household), **self.selector_options)
+		except BaseException as e:
+			with self.lock:
+				del self.loading[key]
+			loading.set_exception(e)
+			raise
+		with self.lock:
+			del self.loading[key]
+			self.selectors[key] = selector
+			self.checkouts[selector] += 1
+			evicted = self.evict()
+		loading.set_result(None)
+		for old in evicted:
+			old.close()
+		return selector
+
+	def reload_due(self, key, selector):
+		# 和界面的自动重新加载一样：文件改了以后，隔一段时间再看修改时间和大小都没再变（已经保存完）才重新加载，
+		# 不会读到写了一半的文件、把还没写进去的菜当成删掉
+		now = time.monotonic()
+		with self.lock:
+			checked, pending = self.reload_checks.get(key, (None, None))
+			if checked is not None and now - checked < self.reload_interval:
+				return False
+			try:
+				stat = os.stat(key[0])
+			except OSError:
+				return False
+			signature = (stat.st_mtime_ns, stat.st_size)
+			if signature == selector.catalogue_stat:
+				self.reload_checks[key] = (now, None)
+				return False
+			self.reload_checks[key] = (now, signature)
+			return signature == pending
+
+	def take(self, key):
+		# 在 self.lock 内调用；刚被挤出去、还没关闭的实例也拿回来用，同一个用户不会同时有两个实例写同一份数据
+		selector = self.selectors.get(key)
+		if selector is None:
+			selector = self.closing.pop(key, None)
+		if selector is not None:
+			self.selectors[key] = selector
+			self.selectors.move_to_end(key)
+			self.checkouts[selector] += 1
+		return selector
+
+	def evict(self):
+		# 在 self.lock 内调用；返回可以马上关闭的实例，还有请求在用的先放进 closing
+		evicted = []
+		while len(self.selectors) > self.capacity:
+			key, old = self.selectors.popitem(last=False)
+			self.reload_checks.pop(key, None)
+			if self.checkouts[old]:
+				self.closing[key] = old
+			else:
+				evicted.append(old)
+		return evicted
+
+	def release(self, selector):
+		with self.lock:
+			self.checkouts[selector] -= 1
+			if self.checkouts[selector] > 0:
+				return
+			del self.checkouts[selector]
+			key = next((key for key, old in self.closing.items() if old is selector), None)
+			if key is None:
+				return
+			del self.closing[key]
+		selector.close()
+
+	def close(self):
+		with self.lock:
+			selectors = list(self.selectors.values()) + list(self.closing.values())
+			self.selectors.clear()
+			self.closing.clear()
+		for selector in selectors:
+			selector.close()
+
+
+class MenuService:
+	def __init__(self, pool, workers=4):
+		self.pool = pool
+		self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="menu-worker")
+
+	def generate(self, request):
+		nutrition_target = request.get('nutrition', {"protein": 70, "fat": 50, "carb": 100})
+		start_date = datetime.date.fromisoformat(request.get('date', datetime.date.today().isoformat()))
+		days = int(request.get('days', 1))
+		with self.pool.checkout(request['excel'], request.get('household', 'default')) as selector:
+			if days == 1:
+				menu = selector.generate_daily_menu(nutrition_target, regenerate=bool(request.get('regenerate')),
+				                                    date=start_date)
+				return {"menus": {start_date.isoformat(): menu}}
+			return {"menus": selector.generate_plan(start_date, days, nutrition_target, commit=False)}
+
+	def confirm(self, request):
+		with self.pool.checkout(request['excel'], request.get('household', 'default')) as selector:
+			menus = {date: selector.dishes_by_name(names) for date, names in request['menus'].items()}
+			selector.add_menus_to_history(menus)
+		return {"confirmed": sorted(menus)}
+
+	def history(self, request):
+		start = request.get('start', '0001-01-01')
+		end = request.get('end', '9999-12-31')
+		with self.pool.checkout(request['excel'], request.get('household', 'default')) as selector:
+			return {"menus": dict(selector.get_menus_between(start, end))}
+
+	def submit(self, route, request):
+		handler = {"/generate": self.generate, "/confirm": self.confirm, "/history": self.history}.get(route)
+		if handler is None:
+			raise LookupError(route)
+		return self.executor.submit(handler, request)
+
+	def shutdown(self):
+		self.executor.shutdown(wait=True)
+		self.pool.close()
+
+
+class MenuRequestHandler(BaseHTTPRequestHandler):
+	protocol_version = "HTTP/1.1"
+
+	def do_GET(self):
+		url = urllib.parse.urlsplit(self.path)
+		request = {key: values[-1] for key, values in urllib.parse.parse_qs(url.query).items()}
+		self.dispatch(url.path, request)
+
+	def do_POST(self):
+		try:
+			length = int(self.headers.get('Content-Length', 0))
+			request = json.loads(self.rfile.read(length) or b'{}')
+		except ValueError as e:
+			self.reply(400, {"error": f"请求格式错误: {e}"})
+			return
+		self.dispatch(urllib.parse.urlsplit(self.path).path, request)
+
+	def dispatch(self, route, request):
+		try:
+			result = self.server.service.submit(route, request).result()
+		except LookupError:
+			self.reply(404, {"error": f"未知接口: {route}"})
+		except (KeyError, ValueError, TypeError) as e:
+			self.reply(400, {"error": str(e)})
+		except Exception as e:
+			self.reply(500, {"error": str(e)})
+		else:
+			self.reply(200, result)
+
+	def reply(self, status, payload):
+		body = json.dumps(payload, ensure_ascii=False, default=dish_to_dict).encode('utf-8')
+		self.send_response(status)
+		self.send_header('Content-Type', 'application/json; charset=utf-8')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, format, *args):
+		pass
+
+
+def create_server(host, port, catalogue_dir=".", data_root="data", workers=4, cache_size=16):
+	server = ThreadingHTTPServer((host, port), MenuRequestHandler)
+	server.daemon_threads = True
+	server.service = MenuService(SelectorPool(catalogue_dir, data_root, capacity=cache_size), workers=workers)
+	return server
@@ -0,0 +1,81 @@
+import collections
+import csv
+import json
+
+import numpy as np
+
+from diet_engine.ingredients import parse_ingredient, split_ingredients
+
+
+class ShoppingMatrix:
+	def __init__(self, ingredient_index):
+		# 列是 (食材名, 单位)；同一种食材不同单位分开累计，没写数量的按 1 份算
+		self.columns = {}
+		self.column_keys = []
+		token_columns = []
+		token_amounts = []
+		for token in ingredient_index.tokens:
+			name, amount, unit = parse_ingredient(token)
+			token_columns.append(self.column((name, unit)))
+			token_amounts.append(1.0 if amount is None else amount)
+		token_columns = np.array(token_columns, dtype=np.int64)
+		token_amounts = np.array(token_amounts, dtype=float)
+
+		# 按 CSR 存储：第 i 道菜的非零项在 indices/data[indptr[i]:indptr[i + 1]]
+		rows = [main + side for main, side in zip(ingredient_index.dish_main, ingredient_index.dish_side)]
+		self.indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+		self.indptr[1:] = np.cumsum([len(row) for row in rows])
+		tokens = np.array([token_id for row in rows for token_id in row], dtype=np.int64)
+		self.indices = token_columns[tokens]
+		self.data = token_amounts[tokens]
+
+	def column(self, key):
+		column_id = self.columns.get(key)
+		if column_id is None:
+			column_id = self.columns[key] = len(self.column_keys)
+			self.column_keys.append(key)
+		return column_id
+
+	def aggregate(self, dish_counts):
+		# 购物清单 = 矩阵转置 × 每道菜的次数向量
+		row_weights = np.repeat(np.asarray(dish_counts, dtype=float), np.diff(self.indptr))
+		return np.bincount(self.indices, weights=self.data * row_weights, minlength=len(self.column_keys))
+
+
+def build_shopping_list(matrix, dish_index, menus):
+	dish_counts = np.zeros(len(matrix.indptr) - 1)
+	extra = collections.Counter()
+	for menu in menus:
+		for dish in menu:
+			dish_id = dish_index.get(dish['name'])
+			if dish_id is not None:
+				dish_counts[dish_id] += 1
+				continue
+			# 历史里的菜已经不在当前食谱中，单独解析
+			for token in split_ingredients(dish['main_ingredients']) + split_ingredients(dish['side_ingredients']):
+				name, amount, unit = parse_ingredient(token)
+				extra[(name, unit)] += 1.0 if amount is None else amount
+
+	totals = matrix.aggregate(dish_counts)
+	items = collections.Counter(extra)
+	for column_id in np.flatnonzero(totals):
+		items[matrix.column_keys[column_id]] += float(totals[column_id])
+	return [{'name': name, 'amount': amount, 'unit': unit} for (name, unit), amount in sorted(items.items())]
+
+
+def format_shopping_item(item):
+	if item['unit']:
+		return f"{item['name']} {item['amount']:g}{item['unit']}"
+	return f"{item['name']} ×{item['amount']:g}"
+
+
+def write_shopping_list(items, path):
+	if path.lower().endswith('.json'):
+		with open(path, 'w', encoding='utf-8') as f:
+			json.dump(items, f, ensure_ascii=False, indent=2)
+		return
+	# utf-8-sig 方便直接用 Excel 打开
+	with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+		writer = csv.DictWriter(f, fieldnames=['name', 'amount', 'unit'])
+		writer.writeheader()
+		writer.writerows(items)
@@ -0,0 +1,63 @@
+import numpy as np
+
+# 每个字节里 1 的个数，numpy 没有 bitwise_count 时查表
+BYTE_COUNTS = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount(words):
+	# 按最后一维统计 uint64 位集里 1 的个数
+	if hasattr(np, "bitwise_count"):
+		return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+	return BYTE_COUNTS[words.view(np.uint8)].sum(axis=-1, dtype=np.int64)
+
+
+class IngredientSignatures:
+	max_bits = 1024
+	# 超过这个比例的菜都用到的辅料（葱姜蒜之类）不算进相似度
+	common_fraction = 0.25
+
+	def __init__(self, ingredient_index):
+		# 每道菜用到的食材（去掉用量，“鸡腿/鸡胸肉” 拆成两种）记成一个位集，食材种类太多时按编号折叠
+		index = ingredient_index
+		mains = [self.ingredient_names(index, token_ids) for token_ids in index.dish_main]
+		sides = [self.ingredient_names(index, token_ids) for token_ids in index.dish_side]
+		frequency = {}
+		for names in sides:
+			for name in names:
+				frequency[name] = frequency.get(name, 0) + 1
+		limit = self.common_fraction * len(sides)
+		bit_ids = {}
+		rows, bits = [], []
+		for i, (main, side) in enumerate(zip(mains, sides)):
+			for name in main | {name for name in side if frequency[name] <= limit}:
+				rows.append(i)
+				bits.append(bit_ids.setdefault(name, len(bit_ids)))
+		width = min(self.max_bits, max(64, -(-len(bit_ids) // 64) * 64))
+		bits = np.asarray(bits, dtype=np.int64) % width
+		# 按列存放：算相似度时逐个取出某一位所在的那一列
+		self.words = np.zeros((len(mains), width // 64), dtype=np.uint64, order='F')
+		np.bitwise_or.at(self.words, (np.asarray(rows, dtype=np.int64), bits >> 6),
+		                 np.left_shift(np.uint64(1), (bits & 63).astype(np.uint64)))
+		self.counts = popcount(self.words)
+
+	@staticmethod
+	def ingredient_names(index, token_ids):
+		return {part for token_id in token_ids for part in index.names[token_id].split('/') if part}
+
+	def similarity(self, dish_ids):
+		# 每道菜和 dish_ids 里最像的那道菜的 Jaccard 相似度（共同食材数 / 食材并集数）
+		# 一道菜只有几种食材，只看它置位的那几位，每位一次整列的移位和按位与
+		best = np.zeros(len(self.words))
+		common = np.zeros(len(self.words), dtype=np.uint64)
+		for i in set(dish_ids):
+			if not self.counts[i]:
+				continue
+			common[:] = 0
+			for word, value in enumerate(self.words[i].tolist()):
+				while value:
+					bit = (value & -value).bit_length() - 1
+					value &= value - 1
+					common += (self.words[:, word] >> np.uint64(bit)) & np.uint64(1)
+			union = self.counts + int(self.counts[i]) - common.astype(np.int64)
+			np.maximum(best, common / np.maximum(union, 1), out=best)
+		return best
@@ -0,0 +1,101 @@
+import io
+import json
+import os
+
+import numpy as np
+
+from diet_engine.persist import atomic_write
+
+
+class WeightJournal:
+	# 权重状态 = 最近一次快照 + 之后的事件日志；每 snapshot_every 个事件压缩成新快照
+	# 版本 2 起存的是权重的对数；版本 1 存的是权重本身，读的时候换算
+	version = 2
+
+	def __init__(self, snapshot_path, log_path, snapshot_every=200):
+		self.snapshot_path = snapshot_path
+		self.log_path = log_path
+		self.snapshot_every = snapshot_every
+		self.log_file = None
+		# 日志里现有的事件数（含启动时读到的），满 snapshot_every 个就压缩
+		self.log_events = 0
+		# 本实例追加、还没进快照的事件数；只读过日志的实例关闭时不写快照，
+		# 免得同一目录下另一个还在用的实例刚写的事件被旧状态的快照覆盖
+		self.pending_events = 0
+
+	def read_snapshot(self):
+		if not os.path.exists(self.snapshot_path):
+			return None
+		try:
+			with np.load(self.snapshot_path, allow_pickle=False) as data:
+				meta = json.loads(str(data['meta']))
+				if meta.get('version') == 1:
+					with np.errstate(divide='ignore'):
+						log_weights = np.log(data['weights'])
+				elif meta.get('version') == self.version:
+					log_weights = data['log_weights']
+				else:
+					return None
+				return {
+					'meta': meta,
+					'names': data['names'].tolist(),
+					'log_weights': log_weights,
+					'initial_weights': data['initial_weights'],
+				}
+		except Exception as e:
+			print(f"读取权重快照失败: {e}")
+			return None
+
+	def read_events(self):
+		events = []
+		if not os.path.exists(self.log_path):
+			return events
+		with open(self.log_path, 'rb') as f:
+			data = f.read()
+		complete = 0
+		for line in data.splitlines(keepends=True):
+			# 写到一半崩溃留下的残行（没有换行或解析不了），后面的都不可信
+			if not line.endswith(b"\n"):
+				break
+			try:
+				events.append(json.loads(line))
+			except ValueError:
+				break
+			complete += len(line)
+		if complete < len(data):
+			# 截回最后一个完整行，之后追加的事件不会接在残行后面、下次读的时候被一起丢掉
+			print(f"权重记录末尾有 {len(data) - complete} 字节写到一半的内容，已截掉")
+			with open(self.log_path, 'r+b') as f:
+				f.truncate(complete)
+		self.log_events = len(events)
+		return events
+
+	def append(self, event):
+		if self.log_file is None:
+			os.makedirs(os.path.dirname(self.log_path) or '.', exist_ok=True)
+			self.log_file = open(self.log_path, 'a', encoding='utf-8')
+		self.log_file.write(json.dumps(event, ensure_ascii=False) + "\n")
+		self.log_file.flush()
+		self.pending_events += 1
+		self.log_events += 1
+		return self.log_events >= self.snapshot_every
+
+	def write_snapshot(self, names, log_weights, initial_weights, meta):
+		meta = dict(meta, version=self.version)
+		buffer = io.BytesIO()
+		np.savez(buffer, meta=np.array(json.dumps(meta, ensure_ascii=False)), names=np.array(names, dtype=str),
+		         log_weights=np.asarray(log_weights, dtype=float), initial_weights=np.asarray(initial_weights, dtype=float))
+		# 快照要在清空日志之前落盘，这里同步写
+		atomic_write(self.snapshot_path, buffer.getvalue())
+		# 快照已包含全部事件，日志从头开始
+		if self.log_file is not None:
+			self.log_file.close()
+			self.log_file = None
+		open(self.log_path, 'w', encoding='utf-8').close()
+		self.log_events = 0
+		self.pending_events = 0
+
+	def close(self):
+		if self.log_file is not None:
+			self.log_file.close()
+			self.log_file = None
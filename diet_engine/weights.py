@@ -0,0 +1,354 @@
+import bisect
+import itertools
+import math
+import random
+
+import numpy as np
+
+
+class FenwickSampler:
+	def __init__(self, weights):
+		self.rebuild(weights)
+
+	def rebuild(self, weights):
+		self.size = len(weights)
+		self.values = np.asarray(weights, dtype=float).tolist()
+		# 树节点 i 覆盖区间 (i - lowbit(i), i]，用前缀和一次性向量化建树
+		cumulative = np.concatenate(([0.0], np.cumsum(weights, dtype=float)))
+		index = np.arange(1, self.size + 1)
+		self.tree = [0.0] + (cumulative[index] - cumulative[index - (index & -index)]).tolist()
+		self.top = 1 << (self.size.bit_length() - 1) if self.size else 0
+
+	def add(self, i, delta):
+		i += 1
+		while i <= self.size:
+			self.tree[i] += delta
+			i += i & -i
+
+	def update(self, i, weight):
+		weight = float(weight)
+		self.add(i, weight - self.values[i])
+		self.values[i] = weight
+
+	def prefix(self, count):
+		total = 0.0
+		while count > 0:
+			total += self.tree[count]
+			count -= count & -count
+		return total
+
+	def total(self):
+		return self.prefix(self.size)
+
+	def find(self, rand_val):
+		# 返回第一个累计权重 >= rand_val 的下标
+		position = 0
+		step = self.top
+		while step:
+			nxt = position + step
+			if nxt <= self.size and self.tree[nxt] < rand_val:
+				position = nxt
+				rand_val -= self.tree[nxt]
+			step >>= 1
+		return min(position, self.size - 1)
+
+	def draw(self, exclusion=None):
+		# 被排除的区间整段从总权重里减掉，抽到的随机数再跳过这些区间映射回树上，不改动树
+		ranges = exclusion.ranges if exclusion is not None else []
+		skipped = [(self.prefix(start), self.prefix(end) - self.prefix(start)) for start, end in ranges]
+		total_weight = self.total() - sum(weight for _, weight in skipped)
+		if total_weight <= 0:
+			return None
+		rand_val = total_weight * (1.0 - random.random())
+		for before, weight in skipped:
+			if rand_val > before:
+				rand_val += weight
+			else:
+				break
+		position = self.find(rand_val)
+		if self.values[position] > 0 and (exclusion is None or not exclusion.covers(position)):
+			return position
+		# 浮点误差可能落到零权重项或被排除的区间边上，就近找一个可用的
+		for candidate in itertools.chain(range(position - 1, -1, -1), range(position + 1, self.size)):
+			if self.values[candidate] > 0 and (exclusion is None or not exclusion.covers(candidate)):
+				return candidate
+		return None
+
+
+class Exclusion:
+	def __init__(self, position, ranges):
+		# ranges 是抽样位置上的 [start, end) 区间，合并成按起点排好序、互不重叠的列表
+		merged = []
+		for start, end in sorted(ranges):
+			if merged and start <= merged[-1][1]:
+				merged[-1][1] = max(merged[-1][1], end)
+			else:
+				merged.append([start, end])
+		self.ranges = [(start, end) for start, end in merged]
+		self.starts = [start for start, _ in self.ranges]
+		self.count = sum(end - start for start, end in self.ranges)
+		self.position = position
+		# 按菜品下标额外排除的菜（布尔数组），只在按下标判断时生效
+		self.blocked = None
+
+	def covers(self, position):
+		i = bisect.bisect_right(self.starts, position) - 1
+		return i >= 0 and position < self.ranges[i][1]
+
+	def __contains__(self, dish_id):
+		return self.covers(self.position[dish_id]) or self.blocked is not None and bool(self.blocked[dish_id])
+
+	def mask(self):
+		# 按菜品下标展开成布尔数组，True 表示被排除
+		covered = np.zeros(len(self.position), dtype=bool)
+		for start, end in self.ranges:
+			covered[start:end] = True
+		covered = covered[self.position]
+		return covered if self.blocked is None else covered | self.blocked
+
+
+def log_of(weights):
+	# 权重为 0 的菜（删掉的、惩罚到 0 的）对数是 -inf，抽样时 exp 回来还是 0
+	if isinstance(weights, (int, float)):
+		return math.log(weights) if weights > 0 else -math.inf
+	with np.errstate(divide='ignore'):
+		return np.log(np.asarray(weights, dtype=float))
+
+
+class WeightStore:
+	nutrient_factors = {"protein": 0.1, "fat": 0.05, "carb": 0.08}
+	partition_columns = ("main_protein", "difficulty")
+	# 真实权重 = exp(log_weights + offset)。所有菜乘同一个数只改 offset；
+	# log_weights 的最大值偏离 0 超过这个数时整体平移进 offset，抽样树里的 exp(log_weights) 不会上溢或下溢
+	renormalize_limit = 64.0
+	# 折扣变了的菜不超过总数的 1/16 时逐个更新抽样树，再多就整棵重建
+	point_update_ratio = 16
+
+	def __init__(self, dishes, initial_weights):
+		self.names = [dish['name'] for dish in dishes]
+		self.index = {name: i for i, name in enumerate(self.names)}
+		self.log_weights = log_of(initial_weights)
+		self.offset = 0.0
+		self.nutrients = {
+			nutrient: np.array([dish[nutrient] for dish in dishes], dtype=float)
+			for nutrient in self.nutrient_factors
+		}
+		self.build_partitions(dishes)
+		# recent_dishes 中每道菜出现的次数（菜品下标 -> 次数），只记 >0 的
+		self.recent_counts = {}
+		# 热加载时删掉的菜：保留位置，权重和营养清零，并且总是被排除
+		self.removed = []
+		# 只影响抽样的临时折扣（比如和最近吃过的菜太像），不算进学到的权重
+		self.discount = None
+		self.sampler = FenwickSampler(self.sampling_weights[self.order])
+		self.sampler_dirty = False
+
+	def build_partitions(self, dishes):
+		# 抽样树里的菜按 (主蛋白, 难度) 排序：每种主蛋白是一段连续区间，难度是每种主蛋白里的一小段
+		keys = [tuple(dish[col] for col in self.partition_columns) for dish in dishes]
+		self.order = np.array(sorted(range(len(dishes)), key=keys.__getitem__), dtype=np.int64)
+		self.position = np.empty_like(self.order)
+		self.position[self.order] = np.arange(len(self.order))
+		# 每种 (主蛋白, 难度) 组合一个编号，排除规则只看这两列，编号相同的菜排除条件也相同
+		self.partition_codes = {}
+		self.partition_keys = np.array([self.partition_code(key) for key in keys], dtype=np.int64)
+		self.partitions = {}
+		for c, col in enumerate(self.partition_columns):
+			ranges = self.partitions[col] = {}
+			start = 0
+			for end in range(1, len(keys) + 1):
+				if end == len(keys) or keys[self.order[end]][c] != keys[self.order[start]][c]:
+					ranges.setdefault(keys[self.order[start]][c], []).append((start, end))
+					start = end
+
+	def partition_code(self, key):
+		return self.partition_codes.setdefault(key, len(self.partition_codes))
+
+	def partition_key(self, i):
+		return next(key for key, code in self.partition_codes.items() if code == self.partition_keys[i])
+
+	def add_to_partitions(self, key, position):
+		for col, value in zip(self.partition_columns, key):
+			ranges = self.partitions[col].setdefault(value, [])
+			if ranges and ranges[-1][1] == position:
+				ranges[-1] = (ranges[-1][0], position + 1)
+			else:
+				ranges.append((position, position + 1))
+
+	def remove_from_partitions(self, key, position):
+		for col, value in zip(self.partition_columns, key):
+			ranges = self.partitions[col][value]
+			r = next(r for r, (start, end) in enumerate(ranges) if start <= position < end)
+			start, end = ranges[r]
+			ranges[r:r + 1] = [(a, b) for a, b in ((start, position), (position + 1, end)) if a < b]
+
+	def append_dishes(self, dishes, initial_weights):
+		# 新菜接在末尾，抽样树里也放在最后；每道新菜在各分组里是一段长度为 1 的区间（相邻同组的会合并）
+		first = len(self.names)
+		self.names.extend(dish['name'] for dish in dishes)
+		self.index.update((dish['name'], first + k) for k, dish in enumerate(dishes))
+		self.log_weights = np.concatenate([self.log_weights, log_of(initial_weights) - self.offset])
+		for nutrient in self.nutrient_factors:
+			self.nutrients[nutrient] = np.concatenate(
+				[self.nutrients[nutrient], np.array([dish[nutrient] for dish in dishes], dtype=float)])
+		ids = np.arange(first, first + len(dishes))
+		self.order = np.concatenate([self.order, ids])
+		self.position = np.concatenate([self.position, ids])
+		keys = [tuple(dish[col] for col in self.partition_columns) for dish in dishes]
+		self.partition_keys = np.concatenate(
+			[self.partition_keys, np.array([self.partition_code(key) for key in keys], dtype=np.int64)])
+		for i, key in zip(ids.tolist(), keys):
+			self.add_to_partitions(key, i)
+		self.discount = None
+		self.sampler_dirty = True
+
+	def patch_dish(self, i, dish, log_weight):
+		for nutrient in self.nutrient_factors:
+			self.nutrients[nutrient][i] = dish[nutrient]
+		self.log_weights[i] = log_weight - self.offset
+		key = tuple(dish[col] for col in self.partition_columns)
+		old_key = self.partition_key(i)
+		if key != old_key:
+			# 主蛋白或难度改了：从原来的区间里拆出来，单独登记到新分组
+			position = int(self.position[i])
+			self.remove_from_partitions(old_key, position)
+			self.add_to_partitions(key, position)
+			self.partition_keys[i] = self.partition_code(key)
+		self.sampler_dirty = True
+
+	def remove_dish(self, i):
+		self.index.pop(self.names[i], None)
+		self.log_weights[i] = -np.inf
+		for nutrient in self.nutrient_factors:
+			self.nutrients[nutrient][i] = 0.0
+		self.removed.append(int(self.position[i]))
+		self.sampler_dirty = True
+
+	@property
+	def live_mask(self):
+		live = np.ones(len(self.names), dtype=bool)
+		live[self.order[self.removed]] = False
+		return live
+
+	def __len__(self):
+		return len(self.log_weights)
+
+	def __getitem__(self, name):
+		return float(np.exp(self.log_weights[self.index[name]] + self.offset))
+
+	@property
+	def weights(self):
+		# 真实权重；用得很久之后可能超出 float 范围，只在需要绝对值时用
+		with np.errstate(over='ignore'):
+			return np.exp(self.log_weights + self.offset)
+
+	@property
+	def absolute_log_weights(self):
+		return self.log_weights + self.offset
+
+	@property
+	def sampling_weights(self):
+		# 抽样只看相对大小，不带 offset
+		weights = np.exp(self.log_weights)
+		return weights if self.discount is None else weights * self.discount
+
+	def sampling_weight(self, i):
+		weight = np.exp(self.log_weights[i])
+		return weight if self.discount is None else weight * self.discount[i]
+
+	def update_sampler(self, ids):
+		# 只改了少数几道菜时逐个更新抽样树，O(k log n)
+		if not self.sampler_dirty:
+			for i in ids:
+				self.sampler.update(self.position[i], self.sampling_weight(i))
+
+	def renormalize(self):
+		# 权重为 0 的菜是 -inf，不影响最大值；全是 0 时不用平移
+		if not len(self.log_weights):
+			return
+		shift = self.log_weights.max()
+		if np.isfinite(shift) and abs(shift) > self.renormalize_limit:
+			self.log_weights -= shift
+			self.offset += shift
+			self.sampler_dirty = True
+
+	def set_discount(self, factors):
+		old = self.discount
+		self.discount = factors
+		if factors is old or self.sampler_dirty:
+			return
+		if factors is None or old is None:
+			changed = np.flatnonzero((old if factors is None else factors) != 1.0)
+		else:
+			changed = np.flatnonzero(factors != old)
+		if len(changed) * self.point_update_ratio <= len(self.names):
+			self.update_sampler(changed.tolist())
+		else:
+			self.sampler_dirty = True
+
+	def mark_recent(self, name, delta=1):
+		i = self.index.get(name)
+		if i is not None:
+			count = self.recent_counts.get(i, 0) + delta
+			if count > 0:
+				self.recent_counts[i] = count
+			else:
+				self.recent_counts.pop(i, None)
+
+	def apply_penalty_and_reward(self, penalty, reward):
+		# 统一奖励只改 offset，惩罚只动最近吃过的几道菜
+		ids = list(self.recent_counts)
+		if ids:
+			self.log_weights[ids] += log_of(penalty)
+			self.update_sampler(ids)
+		self.offset += log_of(reward)
+
+	def apply_nutrition_gap(self, nutrition_gap):
+		# 营养加成是加在真实权重上的：w + a = exp(logaddexp(log w, log a))
+		bonus = sum(self.nutrients[nutrient] * self.nutrient_factors[nutrient]
+		            for nutrient, gap in nutrition_gap.items() if gap > 0)
+		if isinstance(bonus, np.ndarray):
+			self.log_weights = np.logaddexp(self.log_weights, log_of(bonus) - self.offset)
+			self.sampler_dirty = True
+			self.renormalize()
+
+	def assign_log(self, ids, log_weights):
+		self.log_weights[ids] = np.asarray(log_weights, dtype=float) - self.offset
+		self.sampler_dirty = True
+		self.renormalize()
+
+	def scale(self, name, factor):
+		i = self.index[name]
+		self.log_weights[i] += log_of(factor)
+		if self.log_weights[i] > self.renormalize_limit:
+			self.renormalize()
+		self.update_sampler([i])
+
+	def exclusion(self, names=(), groups=()):
+		# names 是要排除的菜名，groups 是要排除的 (列, 取值) 分组
+		ranges = [(self.position[self.index[name]], self.position[self.index[name]] + 1)
+		          for name in names if name in self.index]
+		ranges.extend((position, position + 1) for position in self.removed)
+		for col, value in groups:
+			ranges.extend(self.partitions[col].get(value, ()))
+		return Exclusion(self.position, ranges)
+
+	def draw_among(self, candidates):
+		weights = self.sampling_weights[candidates]
+		total_weight = weights.sum()
+		if total_weight <= 0:
+			return random.choice(candidates)
+		return random.choices(candidates, weights=weights.tolist())[0]
+
+	def refresh_sampler(self):
+		# 反正要整棵重建，顺便检查一下有没有整体漂得太远
+		self.renormalize()
+		self.sampler.rebuild(self.sampling_weights[self.order])
+		self.sampler_dirty = False
+
+	def draw(self, exclusion=None):
+		# 返回菜品下标
+		if self.sampler_dirty:
+			self.refresh_sampler()
+		position = self.sampler.draw(exclusion)
+		return None if position is None else int(self.order[position])